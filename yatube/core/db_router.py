@@ -0,0 +1,84 @@
+"""Чтение с реплик базы данных.
+
+Реплики перечислены в DATABASE_REPLICAS вместе с весами. Читать с них
+разрешено только внутри безопасного HTTP-запроса (GET, HEAD), который
+ReplicaMiddleware помечает через use_replica(); фоновые задачи,
+команды и транзакции всегда работают с default. После собственной
+записи пользователь REPLICA_STICKY_SECONDS секунд читает с default,
+чтобы сразу видеть свои изменения.
+
+Данные, которые кладутся в общий кэш, читаются с default (см.
+read_from_primary): отстающая реплика иначе закэширует старое
+состояние для всех пользователей до следующего сброса.
+"""
+import random
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_local = threading.local()
+
+
+def choose_replica():
+    """Реплика с учётом весов или default, если реплик нет."""
+    replicas = settings.DATABASE_REPLICAS
+    if not replicas:
+        return DEFAULT_DB_ALIAS
+    aliases = list(replicas)
+    return random.choices(
+        aliases, weights=[replicas[alias] for alias in aliases])[0]
+
+
+@contextmanager
+def use_replica(alias):
+    """Разрешает чтение с alias в текущем потоке."""
+    _local.replica = alias
+    _local.wrote = False
+    try:
+        yield
+    finally:
+        _local.replica = None
+
+
+@contextmanager
+def read_from_primary():
+    """Временно читает с default внутри use_replica()."""
+    replica = getattr(_local, 'replica', None)
+    _local.replica = None
+    try:
+        yield
+    finally:
+        _local.replica = replica
+
+
+def stick_to_primary():
+    """Читает с default до конца текущего запроса."""
+    _local.replica = None
+
+
+def wrote_to_primary():
+    return getattr(_local, 'wrote', False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replica = getattr(_local, 'replica', None)
+        if replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return replica
+
+    def db_for_write(self, model, **hints):
+        _local.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплики получают схему вместе с данными от default
+        return db == DEFAULT_DB_ALIAS
@@ -0,0 +1,169 @@
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+SCHEMA = (
+    'CREATE TABLE post (id INTEGER PRIMARY KEY, text TEXT NOT NULL, '
+    'pub_date REAL NOT NULL, comments_count INTEGER NOT NULL DEFAULT 0)',
+    'CREATE INDEX post_feed_idx ON post (pub_date DESC, id DESC)',
+    'CREATE TABLE comment (id INTEGER PRIMARY KEY, post_id INTEGER NOT NULL '
+    'REFERENCES post (id), text TEXT NOT NULL, created REAL NOT NULL)',
+    'CREATE INDEX comment_post_created_idx ON comment (post_id, created)',
+)
+
+# Поведение Django по умолчанию: журнал отката и таймаут модуля sqlite3
+DEFAULT_PROFILE = ({}, 5.0)
+
+
+def percentile(values, percent):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[int(round(percent / 100 * (len(values) - 1)))]
+
+
+def connect(path, profile):
+    pragmas, timeout = profile
+    db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    for name, value in pragmas.items():
+        db.execute('PRAGMA {} = {}'.format(name, value))
+    return db
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность SQLite с настройками по '
+        'умолчанию и с SQLITE_PRAGMAS при параллельных чтениях и записях'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument(
+            '--seconds', type=float, default=5,
+            help='Длительность прогона для каждого профиля'
+        )
+        parser.add_argument(
+            '--posts', type=int, default=10000,
+            help='Сколько постов заранее положить в базу'
+        )
+
+    def handle(self, *args, **options):
+        tuned = (
+            settings.SQLITE_PRAGMAS,
+            settings.DATABASES['default'].get('OPTIONS', {}).get(
+                'timeout', 5.0)
+        )
+        self.stdout.write(
+            '{:<8} {:>9} {:>9} {:>7} {:>12} {:>12}'.format(
+                'profile', 'reads/s', 'writes/s', 'locked',
+                'read p99 ms', 'write p99 ms'))
+        for name, profile in (('default', DEFAULT_PROFILE),
+                              ('tuned', tuned)):
+            directory = tempfile.mkdtemp()
+            try:
+                path = os.path.join(directory, 'bench.sqlite3')
+                self.prepare(path, profile, options['posts'])
+                stats = self.run(path, profile, options)
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+            seconds = options['seconds']
+            self.stdout.write(
+                '{:<8} {:>9.0f} {:>9.0f} {:>7} {:>12.1f} {:>12.1f}'.format(
+                    name, stats['reads'] / seconds,
+                    stats['writes'] / seconds, stats['locked'],
+                    percentile(stats['read_times'], 99),
+                    percentile(stats['write_times'], 99)))
+
+    def prepare(self, path, profile, posts):
+        db = connect(path, profile)
+        for statement in SCHEMA:
+            db.execute(statement)
+        now = time.time()
+        db.execute('BEGIN')
+        db.executemany(
+            'INSERT INTO post (text, pub_date) VALUES (?, ?)',
+            (('текст поста ' * 20, now - number) for number in range(posts)))
+        db.execute('COMMIT')
+        db.close()
+
+    def run(self, path, profile, options):
+        stats = Counter()
+        stats['read_times'] = []
+        stats['write_times'] = []
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['seconds']
+        posts = options['posts']
+
+        def reader():
+            db = connect(path, profile)
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    db.execute(
+                        'SELECT id, text, comments_count FROM post '
+                        'ORDER BY pub_date DESC, id DESC LIMIT 10 OFFSET ?',
+                        [random.randrange(100)]
+                    ).fetchall()
+                    db.execute(
+                        'SELECT text FROM comment WHERE post_id = ? '
+                        'ORDER BY created LIMIT 50',
+                        [random.randrange(1, posts + 1)]
+                    ).fetchall()
+                except sqlite3.OperationalError:
+                    with lock:
+                        stats['locked'] += 1
+                    continue
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    stats['reads'] += 1
+                    stats['read_times'].append(elapsed)
+            db.close()
+
+        def writer():
+            db = connect(path, profile)
+            while time.monotonic() < deadline:
+                post_id = random.randrange(1, posts + 1)
+                started = time.perf_counter()
+                try:
+                    # Как add_comment: комментарий и счётчик в транзакции
+                    db.execute('BEGIN')
+                    db.execute(
+                        'INSERT INTO comment (post_id, text, created) '
+                        'VALUES (?, ?, ?)',
+                        [post_id, 'комментарий', time.time()])
+                    db.execute(
+                        'UPDATE post SET comments_count = comments_count + 1 '
+                        'WHERE id = ?', [post_id])
+                    db.execute('COMMIT')
+                except sqlite3.OperationalError:
+                    if db.in_transaction:
+                        db.execute('ROLLBACK')
+                    with lock:
+                        stats['locked'] += 1
+                    continue
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    stats['writes'] += 1
+                    stats['write_times'].append(elapsed)
+            db.close()
+
+        threads = (
+            [threading.Thread(target=reader)
+             for _ in range(options['readers'])]
+            + [threading.Thread(target=writer)
+               for _ in range(options['writers'])]
+        )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return stats
@@ -0,0 +1,204 @@
+"""Метрики запросов в текстовом формате Prometheus.
+
+Каждый процесс копит счётчики и гистограммы в памяти и не чаще раза
+в METRICS_FLUSH_INTERVAL секунд сбрасывает снимок в свой файл в
+METRICS_DIR. Эндпоинт /metrics складывает снимки всех процессов,
+поэтому числа не зависят от того, какой воркер ответил на запрос.
+Снимки завершившихся процессов удаляются при сборе: иначе после
+перезапуска воркеров их старые счётчики складывались бы с новыми.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DESCRIPTIONS = {
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время обработки запроса'),
+    'yatube_template_render_seconds': (
+        'histogram', 'Время рендеринга шаблона страницы'),
+    'yatube_sql_queries_total': (
+        'counter', 'Число SQL-запросов'),
+    'yatube_sql_seconds_total': (
+        'counter', 'Время, проведённое в SQL-запросах'),
+    'yatube_fragment_cache_hits_total': (
+        'counter', 'Попадания в кэш фрагментов лент'),
+    'yatube_fragment_cache_misses_total': (
+        'counter', 'Промахи кэша фрагментов лент'),
+    'yatube_page_cache_hits_total': (
+        'counter', 'Попадания в полностраничный кэш'),
+    'yatube_page_cache_misses_total': (
+        'counter', 'Промахи полностраничного кэша'),
+    'yatube_post_card_cache_hits_total': (
+        'counter', 'Попадания в кэш карточек постов'),
+    'yatube_post_card_cache_misses_total': (
+        'counter', 'Промахи кэша карточек постов'),
+}
+
+_local = threading.local()
+
+
+def set_current_view(view_name):
+    _local.view = view_name
+
+
+def current_view():
+    return getattr(_local, 'view', None) or 'unresolved'
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.flushed_at = 0
+
+    def inc(self, name, labels, value=1):
+        with self.lock:
+            self.counters[_key(name, labels)] += value
+
+    def observe(self, name, labels, value):
+        key = _key(name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {
+                    'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+                    break
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [
+                    [name, dict(labels), value]
+                    for (name, labels), value in self.counters.items()
+                ],
+                'histograms': [
+                    [name, dict(labels),
+                     dict(histogram, buckets=list(histogram['buckets']))]
+                    for (name, labels), histogram in self.histograms.items()
+                ],
+            }
+
+    def flush(self, force=False):
+        """Записывает снимок процесса в METRICS_DIR."""
+        now = time.monotonic()
+        interval = settings.METRICS_FLUSH_INTERVAL
+        if not force and now - self.flushed_at < interval:
+            return
+        self.flushed_at = now
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        path = os.path.join(
+            settings.METRICS_DIR, 'metrics-{}.json'.format(os.getpid()))
+        fd, tmp_path = tempfile.mkstemp(dir=settings.METRICS_DIR)
+        with os.fdopen(fd, 'w') as tmp:
+            json.dump(self.snapshot(), tmp)
+        os.replace(tmp_path, path)
+
+
+registry = Registry()
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс есть, но принадлежит другому пользователю
+        return True
+    return True
+
+
+def collect():
+    """Складывает снимки работающих процессов."""
+    registry.flush(force=True)
+    counters = defaultdict(float)
+    histograms = {}
+    for name in os.listdir(settings.METRICS_DIR):
+        if not (name.startswith('metrics-') and name.endswith('.json')):
+            continue
+        path = os.path.join(settings.METRICS_DIR, name)
+        try:
+            pid = int(name[len('metrics-'):-len('.json')])
+        except ValueError:
+            continue
+        if not _alive(pid):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path) as snapshot:
+                data = json.load(snapshot)
+        except (OSError, ValueError):
+            continue
+        for metric, labels, value in data['counters']:
+            counters[_key(metric, labels)] += value
+        for metric, labels, histogram in data['histograms']:
+            total = histograms.setdefault(
+                _key(metric, labels),
+                {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0})
+            for index, count in enumerate(histogram['buckets']):
+                total['buckets'][index] += count
+            total['sum'] += histogram['sum']
+            total['count'] += histogram['count']
+    return counters, histograms
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\')
+                         .replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in pairs
+    ) + '}'
+
+
+def render():
+    """Текст для Prometheus."""
+    counters, histograms = collect()
+    series = defaultdict(list)
+    for (name, labels), value in counters.items():
+        series[name].append((labels, value))
+    for (name, labels), histogram in histograms.items():
+        series[name].append((labels, histogram))
+    lines = []
+    for name in sorted(series):
+        kind, description = DESCRIPTIONS.get(name, ('untyped', name))
+        lines.append('# HELP {} {}'.format(name, description))
+        lines.append('# TYPE {} {}'.format(name, kind))
+        for labels, value in sorted(series[name], key=lambda item: item[0]):
+            if kind != 'histogram':
+                lines.append('{}{} {}'.format(name, _labels(labels), value))
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS, value['buckets']):
+                cumulative += count
+                lines.append('{}_bucket{} {}'.format(
+                    name, _labels(labels, le=bound), cumulative))
+            lines.append('{}_bucket{} {}'.format(
+                name, _labels(labels, le='+Inf'), value['count']))
+            lines.append('{}_sum{} {}'.format(
+                name, _labels(labels), value['sum']))
+            lines.append('{}_count{} {}'.format(
+                name, _labels(labels), value['count']))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,82 @@
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from core import metrics
+from core.db_router import choose_replica, use_replica, wrote_to_primary
+
+
+class QueryTimer:
+    """execute_wrapper, считающий SQL-запросы и время их выполнения."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Собирает метрики запросов по имени URL, см. core.metrics."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryTimer()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(queries))
+                response = self.get_response(request)
+            labels = {'view': metrics.current_view()}
+            metrics.registry.observe(
+                'yatube_request_duration_seconds', labels,
+                time.perf_counter() - started)
+            metrics.registry.inc(
+                'yatube_sql_queries_total', labels, queries.count)
+            metrics.registry.inc(
+                'yatube_sql_seconds_total', labels, queries.duration)
+        finally:
+            metrics.set_current_view(None)
+        metrics.registry.flush()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics.set_current_view(request.resolver_match.view_name)
+
+
+class ReplicaMiddleware:
+    """Направляет чтения безопасных запросов на реплики.
+
+    После запроса, который что-то записал (в том числе GET, например
+    ленивое создание счётчиков), ставит cookie, и следующие
+    REPLICA_STICKY_SECONDS секунд пользователь читает с default.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        safe = request.method in ('GET', 'HEAD')
+        if safe and settings.REPLICA_STICKY_COOKIE not in request.COOKIES:
+            alias = choose_replica()
+        else:
+            alias = 'default'
+        with use_replica(alias):
+            response = self.get_response(request)
+            wrote = wrote_to_primary()
+        if wrote:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS, httponly=True)
+        return response
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 
 class CreatedModel(models.Model):
@@ -11,3 +12,46 @@ class CreatedModel(models.Model):
 
     class Meta:
         abstract = True
+
+
+class UpdatedQuerySet(models.QuerySet):
+    def bulk_update(self, objs, fields, batch_size=None):
+        """bulk_update, который обновляет и время изменения."""
+        now = timezone.now()
+        for obj in objs:
+            obj.updated = now
+        fields = list(fields)
+        if 'updated' not in fields:
+            fields.append('updated')
+        return super().bulk_update(objs, fields, batch_size=batch_size)
+
+    def touch(self, **kwargs):
+        """update(), отмечающий строки изменёнными."""
+        return self.update(updated=timezone.now(), **kwargs)
+
+    def changed_since(self, since):
+        """Объекты, изменённые позже since, в порядке изменения.
+
+        Запрос идёт по индексу updated, поэтому опрос стоит одинаково
+        при любом размере таблицы.
+        """
+        return self.filter(updated__gt=since).order_by('updated', 'pk')
+
+    def last_changed(self):
+        """Время последнего изменения или None."""
+        return self.order_by('-updated').values_list(
+            'updated', flat=True).first()
+
+
+class UpdatedModel(models.Model):
+    """Абстрактная модель, добавляет время последнего изменения"""
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+        db_index=True
+    )
+
+    objects = UpdatedQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
@@ -0,0 +1,119 @@
+"""Полностраничный кэш для анонимных читателей.
+
+Страницы из ANONYMOUS_PAGE_CACHE_VIEWS кэшируются по пути и строке
+запроса, если у запроса нет cookie сессии. Ответ из кэша отдаётся до
+сессий, аутентификации и view. Ключ включает поколение пути, поэтому
+purge() сбрасывает все варианты страницы (любые ?page= и т.п.) одним
+инкрементом, а purge_all() - вообще все страницы.
+"""
+import hashlib
+import time
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import parse_http_date_safe
+
+from core import metrics
+
+ALL_PAGES = '*'
+
+
+def _generation_key(path):
+    # request.path уже декодирован, а reverse() отдаёт путь в %-кодировке:
+    # приводим оба к одному виду, иначе purge() не найдёт страницы
+    # с кириллицей в адресе
+    return 'page_generation:{}'.format(
+        hashlib.md5(unquote(path).encode()).hexdigest())
+
+
+def _page_key(request):
+    keys = [_generation_key(ALL_PAGES), _generation_key(request.path)]
+    generations = cache.get_many(keys)
+    for key in keys:
+        if key not in generations:
+            cache.add(key, int(time.time() * 1000), None)
+            generations[key] = cache.get(key)
+    value = '{}:{}:{}'.format(
+        generations[keys[0]], generations[keys[1]], request.get_full_path())
+    return 'page:{}'.format(hashlib.md5(value.encode()).hexdigest())
+
+
+def purge(*paths):
+    """Сбрасывает закэшированные варианты страниц по этим путям."""
+    for path in paths:
+        key = _generation_key(path)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(time.time() * 1000), None)
+
+
+def purge_all():
+    purge(ALL_PAGES)
+
+
+class AnonymousPageCacheMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        view_name = self.cacheable_view(request)
+        if view_name is None:
+            return self.get_response(request)
+        if settings.SESSION_COOKIE_NAME in request.COOKIES:
+            response = self.get_response(request)
+            patch_cache_control(response, private=True)
+            return response
+        metrics.set_current_view(view_name)
+        labels = {'view': view_name}
+        key = _page_key(request)
+        entry = cache.get(key)
+        if entry is not None:
+            metrics.registry.inc('yatube_page_cache_hits_total', labels)
+            response = self.restore(entry)
+            return get_conditional_response(
+                request,
+                etag=response.get('ETag'),
+                last_modified=parse_http_date_safe(
+                    response.get('Last-Modified', '')),
+                response=response
+            )
+        metrics.registry.inc('yatube_page_cache_misses_total', labels)
+        response = self.get_response(request)
+        if (response.status_code == 200 and not response.streaming
+                and not response.cookies):
+            patch_cache_control(
+                response, public=True,
+                max_age=settings.ANONYMOUS_PAGE_CACHE_MAX_AGE)
+            patch_vary_headers(response, ['Cookie'])
+            cache.set(key, self.store(response),
+                      settings.ANONYMOUS_PAGE_CACHE_TIMEOUT)
+        return response
+
+    def cacheable_view(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        try:
+            view_name = resolve(request.path_info).view_name
+        except Resolver404:
+            return None
+        if view_name in settings.ANONYMOUS_PAGE_CACHE_VIEWS:
+            return view_name
+        return None
+
+    @staticmethod
+    def store(response):
+        return response.status_code, list(response.items()), response.content
+
+    @staticmethod
+    def restore(entry):
+        status, headers, content = entry
+        response = HttpResponse(content, status=status)
+        for header, value in headers:
+            response[header] = value
+        return response
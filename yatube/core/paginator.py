@@ -0,0 +1,50 @@
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator для больших таблиц.
+
+    Точно считает строки только до EXACT_LIMIT (COUNT по подзапросу с
+    LIMIT). Для таблицы без фильтров число строк дальше оценивается по
+    статистике SQLite (ANALYZE) или по максимальному id, для выборки
+    с фильтрами страницы заканчиваются на EXACT_LIMIT. Условия менеджера
+    модели по умолчанию (например, скрытие удаляемых постов) фильтром
+    не считаются.
+    """
+    EXACT_LIMIT = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        exact = queryset.order_by().values('pk')[:self.EXACT_LIMIT + 1]
+        exact = exact.count()
+        if exact <= self.EXACT_LIMIT or self.is_filtered(queryset):
+            return min(exact, self.EXACT_LIMIT)
+        return max(self.estimate(queryset), exact)
+
+    @staticmethod
+    def is_filtered(queryset):
+        """Есть ли условия сверх тех, что добавляет менеджер модели."""
+        base = queryset.model._default_manager.all()
+        return (str(queryset.order_by().values('pk').query)
+                != str(base.order_by().values('pk').query))
+
+    @staticmethod
+    def estimate(queryset):
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+        if connection.vendor == 'sqlite':
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+                if cursor.fetchone():
+                    cursor.execute(
+                        'SELECT stat FROM sqlite_stat1 WHERE tbl = %s '
+                        'ORDER BY idx IS NOT NULL LIMIT 1', [table])
+                    row = cursor.fetchone()
+                    if row:
+                        return int(row[0].split()[0])
+        return queryset.aggregate(last=Max('pk'))['last'] or 0
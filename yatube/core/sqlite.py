@@ -0,0 +1,20 @@
+"""Настройки соединений SQLite для боевой нагрузки.
+
+PRAGMA из SQLITE_PRAGMAS выполняются для каждого нового соединения
+(сигнал connection_created). WAL позволяет читателям не ждать
+писателя, synchronous=NORMAL в режиме WAL сохраняет целостность базы
+и убирает fsync на каждый коммит, busy_timeout заставляет писателей
+ждать блокировку, а не сразу падать с "database is locked".
+"""
+from django.conf import settings
+
+
+def apply_pragmas(connection):
+    with connection.cursor() as cursor:
+        for name, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute('PRAGMA {} = {}'.format(name, value))
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        apply_pragmas(connection)
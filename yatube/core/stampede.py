@@ -0,0 +1,87 @@
+"""Защита от одновременного пересчёта одного значения кэша.
+
+get_or_compute хранит вместе со значением время его вычисления и
+момент логического устаревания:
+
+* значение пересчитывается немного раньше срока с вероятностью, растущей
+  к концу TTL (алгоритм XFetch), поэтому горячие ключи обычно не
+  успевают истечь под нагрузкой;
+* пересчитывает только тот, кто взял ключ-блокировку через cache.add,
+  остальные в это время получают устаревшую копию (stale-while-
+  revalidate), которая живёт ещё CACHE_STALE_TIMEOUT секунд;
+* если копии нет совсем, остальные недолго ждут результата, а не
+  запускают тот же запрос параллельно.
+"""
+import math
+import random
+import time
+
+from django.conf import settings
+from django.core.cache import cache as default_cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+POLL_INTERVAL = 0.05
+
+
+def _lock_key(key):
+    return '{}:lock'.format(key)
+
+
+def _store(cache, key, compute, timeout):
+    started = time.monotonic()
+    value = compute()
+    delta = time.monotonic() - started
+    if timeout is None:
+        expires, physical = None, None
+    else:
+        expires = time.time() + timeout
+        physical = timeout + settings.CACHE_STALE_TIMEOUT
+    cache.set(key, (value, delta, expires), physical)
+    return value
+
+
+def _recompute_with_lock(cache, key, compute, timeout):
+    lock = _lock_key(key)
+    if not cache.add(lock, 1, settings.CACHE_LOCK_TIMEOUT):
+        return None, False
+    try:
+        return _store(cache, key, compute, timeout), True
+    finally:
+        cache.delete(lock)
+
+
+def _expired(delta, expires, beta):
+    if expires is None:
+        return False
+    early = delta * beta * -math.log(random.random() or 1e-12)
+    return time.time() + early >= expires
+
+
+def get_or_compute(key, compute, timeout=DEFAULT_TIMEOUT, cache=None,
+                   beta=None):
+    """Значение из кэша или compute(), вычисленное одним воркером.
+
+    timeout - логический срок жизни значения, None - бессрочно.
+    """
+    cache = cache or default_cache
+    if timeout is DEFAULT_TIMEOUT:
+        timeout = cache.default_timeout
+    if beta is None:
+        beta = settings.CACHE_EARLY_EXPIRY_BETA
+    entry = cache.get(key)
+    if entry is not None:
+        value, delta, expires = entry
+        if not _expired(delta, expires, beta):
+            return value
+        fresh, computed = _recompute_with_lock(cache, key, compute, timeout)
+        return fresh if computed else value
+    value, computed = _recompute_with_lock(cache, key, compute, timeout)
+    if computed:
+        return value
+    deadline = time.monotonic() + settings.CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+    return _store(cache, key, compute, timeout)
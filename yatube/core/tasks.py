@@ -0,0 +1,78 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.conf import settings
+from django.db import connection, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_process_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.BACKGROUND_TASK_WORKERS,
+            thread_name_prefix='yatube-task'
+        )
+    return _executor
+
+
+def get_process_executor(max_workers=None):
+    """Пул процессов для тяжёлых по CPU задач (обработка картинок).
+
+    Процессы запускаются через spawn и сами настраивают Django, поэтому
+    не наследуют соединения с базой родителя.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers or settings.BACKGROUND_PROCESS_WORKERS,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=django.setup
+    )
+
+
+def _get_process_executor():
+    global _process_executor
+    if _process_executor is None:
+        _process_executor = get_process_executor()
+    return _process_executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Фоновая задача %s завершилась ошибкой',
+                         func.__name__)
+    finally:
+        connection.close()
+
+
+def defer(func, *args, **kwargs):
+    """Выполняет func в фоновом потоке после коммита текущей транзакции.
+
+    При BACKGROUND_TASKS_EAGER = True задача выполняется сразу,
+    это удобно в тестах и при отладке.
+    """
+    if settings.BACKGROUND_TASKS_EAGER:
+        func(*args, **kwargs)
+        return
+    transaction.on_commit(
+        lambda: _get_executor().submit(_run, func, args, kwargs))
+
+
+def defer_cpu(func, *args):
+    """Как defer, но выполняет func в отдельном процессе.
+
+    func должна быть функцией уровня модуля, а аргументы - простыми
+    значениями (id, строки), чтобы их можно было передать в процесс.
+    """
+    if settings.BACKGROUND_TASKS_EAGER:
+        func(*args)
+        return
+    transaction.on_commit(
+        lambda: _get_process_executor().submit(_run, func, args, {}))
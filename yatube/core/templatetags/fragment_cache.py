@@ -0,0 +1,56 @@
+"""Тег {% cache %} с защитой от лавины пересчётов и метриками.
+
+Синтаксис тот же, что у встроенного тега: достаточно заменить
+{% load cache %} на {% load fragment_cache %}. Фрагмент хранится через
+core.stampede.get_or_compute, поэтому после истечения TTL его
+перерисовывает один запрос, а остальные получают прежнюю копию.
+"""
+from django import template
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode, do_cache
+
+from core import metrics
+from core.stampede import get_or_compute
+
+register = template.Library()
+
+
+class FragmentCacheNode(CacheNode):
+    def get_cache(self, context):
+        if self.cache_name:
+            return caches[self.cache_name.resolve(context)]
+        try:
+            return caches['template_fragments']
+        except InvalidCacheBackendError:
+            return caches['default']
+
+    def render(self, context):
+        expire_time = self.expire_time_var.resolve(context)
+        if expire_time is not None:
+            expire_time = int(expire_time)
+        fragment_cache = self.get_cache(context)
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        cache_key = make_template_fragment_key(self.fragment_name, vary_on)
+        labels = {'view': metrics.current_view(),
+                  'fragment': self.fragment_name}
+        rendered = []
+
+        def render_fragment():
+            rendered.append(True)
+            return self.nodelist.render(context)
+
+        value = get_or_compute(
+            cache_key, render_fragment, expire_time, cache=fragment_cache)
+        metrics.registry.inc(
+            'yatube_fragment_cache_misses_total' if rendered
+            else 'yatube_fragment_cache_hits_total', labels)
+        return value
+
+
+@register.tag('cache')
+def do_fragment_cache(parser, token):
+    node = do_cache(parser, token)
+    return FragmentCacheNode(
+        node.nodelist, node.expire_time_var, node.fragment_name,
+        node.vary_on, node.cache_name)
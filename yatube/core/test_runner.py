@@ -0,0 +1,44 @@
+"""Запуск тестов и замеров со своим файлом кэша.
+
+Тесты и benchmark_views вызывают cache.clear(). С общим LOCATION они
+очищали бы кэш запущенного на той же машине сервера и гонялись бы с ним
+за одни и те же ключи, поэтому кэш default переносится во временный
+каталог.
+"""
+import copy
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+def _cache_settings(directory):
+    caches = copy.deepcopy(settings.CACHES)
+    caches['default']['LOCATION'] = os.path.join(directory, 'cache.sqlite3')
+    return override_settings(CACHES=caches)
+
+
+@contextmanager
+def temporary_cache():
+    """Кэш default во временном каталоге, который затем удаляется."""
+    directory = tempfile.mkdtemp(prefix='yatube-cache-')
+    try:
+        with _cache_settings(directory):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TestRunner(DiscoverRunner):
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache = temporary_cache()
+        self._cache.__enter__()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache.__exit__(None, None, None)
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,187 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+
+from .cache import SQLiteCache
+from .db_router import (ReplicaRouter, choose_replica, read_from_primary,
+                        stick_to_primary)
+from .middleware import ReplicaMiddleware
+from .stampede import get_or_compute
+from .test_runner import temporary_cache
+
+
+class SQLiteCacheTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'cache.sqlite3')
+
+    def make_cache(self, **options):
+        return SQLiteCache(self.path, {'OPTIONS': options})
+
+    def test_cache_is_shared_between_instances(self):
+        first, second = self.make_cache(), self.make_cache()
+        first.set_many({'a': [1, 2], 'b': 'строка'})
+        self.assertEqual(second.get_many(['a', 'b', 'c']),
+                         {'a': [1, 2], 'b': 'строка'})
+        second.delete('a')
+        self.assertIsNone(first.get('a'))
+        self.assertTrue(first.add('a', 1))
+        self.assertFalse(second.add('a', 2))
+        first.set('short', 1, timeout=0.01)
+        time.sleep(0.02)
+        self.assertIsNone(second.get('short'))
+        self.assertTrue(second.add('short', 2))
+
+    def test_incr_is_atomic_across_instances(self):
+        self.make_cache().set('counter', 0, None)
+
+        def bump():
+            cache = self.make_cache()
+            for _ in range(50):
+                cache.incr('counter')
+
+        threads = [threading.Thread(target=bump) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.make_cache().get('counter'), 200)
+        with self.assertRaises(ValueError):
+            self.make_cache().incr('missing')
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = self.make_cache(
+            MAX_ENTRIES=10, CULL_FREQUENCY=10, CULL_EVERY=1,
+            ACCESS_RESOLUTION=0)
+        cache.set('keep', 'value')
+        for number in range(15):
+            cache.get('keep')
+            cache.set(f'key{number}', number)
+        self.assertEqual(cache.get('keep'), 'value')
+        self.assertIsNone(cache.get('key0'))
+        self.assertEqual(cache.get('key14'), 14)
+
+    def test_tests_use_their_own_cache_file(self):
+        path = caches['default']._path
+        self.assertTrue(os.path.basename(
+            os.path.dirname(path)).startswith('yatube-cache-'))
+        with temporary_cache():
+            self.assertNotEqual(caches['default']._path, path)
+        self.assertEqual(caches['default']._path, path)
+
+
+class StampedeTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.cache = SQLiteCache(
+            os.path.join(directory, 'cache.sqlite3'), {})
+
+    def compute(self, value):
+        def compute():
+            self.calls.append(value)
+            return value
+        self.calls = []
+        return compute
+
+    def test_only_lock_holder_recomputes_expired_value(self):
+        self.cache.set('key', ('old', 0.1, time.time() - 1))
+        self.cache.add('key:lock', 1)
+        value = get_or_compute(
+            'key', self.compute('new'), 60, cache=self.cache)
+        self.assertEqual((value, self.calls), ('old', []))
+        self.cache.delete('key:lock')
+        value = get_or_compute(
+            'key', self.compute('new'), 60, cache=self.cache)
+        self.assertEqual((value, self.calls), ('new', ['new']))
+        self.assertEqual(self.cache.get('key')[0], 'new')
+
+    def test_miss_waits_for_worker_holding_lock(self):
+        self.cache.add('key:lock', 1)
+        timer = threading.Timer(0.1, lambda: SQLiteCache(
+            self.cache._path, {}).set('key', ('ready', 0.1, None)))
+        timer.start()
+        self.addCleanup(timer.cancel)
+        value = get_or_compute(
+            'key', self.compute('own'), 60, cache=self.cache)
+        self.assertEqual((value, self.calls), ('ready', []))
+
+    def test_value_is_recomputed_early_near_expiry(self):
+        self.cache.set('key', ('old', 10.0, time.time() + 5))
+        value = get_or_compute(
+            'key', self.compute('new'), 60, cache=self.cache, beta=1000)
+        self.assertEqual(value, 'new')
+
+
+@override_settings(DATABASE_REPLICAS={'replica1': 3, 'replica2': 1})
+class ReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def view(self, write=False):
+        def view(request):
+            if write:
+                self.router.db_for_write(None)
+            self.read_from = self.router.db_for_read(None)
+            return HttpResponse()
+        return ReplicaMiddleware(view)
+
+    def test_replicas_are_chosen_by_weight(self):
+        choices = [choose_replica() for _ in range(2000)]
+        self.assertGreater(choices.count('replica1'),
+                           choices.count('replica2') * 2)
+
+    def test_reads_stick_to_primary_after_own_write(self):
+        self.assertEqual(self.router.db_for_read(None), 'default')
+        self.view()(self.factory.get('/'))
+        self.assertIn(self.read_from, ('replica1', 'replica2'))
+        response = self.view(write=True)(self.factory.post('/'))
+        self.assertEqual(self.read_from, 'default')
+        cookie = response.cookies[settings.REPLICA_STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], settings.REPLICA_STICKY_SECONDS)
+        request = self.factory.get('/')
+        request.COOKIES[settings.REPLICA_STICKY_COOKIE] = cookie.value
+        self.view()(request)
+        self.assertEqual(self.read_from, 'default')
+
+    def test_safe_request_that_wrote_sticks_to_primary(self):
+        response = self.view(write=True)(self.factory.get('/'))
+        self.assertIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+
+    def test_cache_fills_read_from_primary(self):
+        def view(request):
+            with read_from_primary():
+                self.filled_from = self.router.db_for_read(None)
+            self.read_from = self.router.db_for_read(None)
+            stick_to_primary()
+            self.stuck_from = self.router.db_for_read(None)
+            return HttpResponse()
+
+        ReplicaMiddleware(view)(self.factory.get('/'))
+        self.assertEqual(self.filled_from, 'default')
+        self.assertIn(self.read_from, ('replica1', 'replica2'))
+        self.assertEqual(self.stuck_from, 'default')
+
+
+class SQLitePragmasTest(TestCase):
+    def test_connection_uses_production_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA cache_size')
+            self.assertEqual(
+                cursor.fetchone()[0], settings.SQLITE_PRAGMAS['cache_size'])
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(
+                cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+
+class UploadSizeLimitHandler(FileUploadHandler):
+    """Отбрасывает файлы больше UPLOAD_MAX_BYTES прямо во время загрузки.
+
+    Стоит первым в FILE_UPLOAD_HANDLERS: считает байты и передаёт куски
+    дальше, а при превышении лимита пропускает остаток файла, не
+    записывая его ни в память, ни на диск. Имена отброшенных полей
+    сохраняются в request.rejected_uploads, чтобы форма показала ошибку.
+    """
+
+    def handle_raw_input(self, input_data, META, content_length, boundary,
+                         encoding=None):
+        self.request.rejected_uploads = []
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.received = 0
+        if self.content_length and (
+                self.content_length > settings.UPLOAD_MAX_BYTES):
+            self._reject()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.UPLOAD_MAX_BYTES:
+            self._reject()
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
+
+    def _reject(self):
+        self.request.rejected_uploads.append(self.field_name)
+        raise SkipFile()
@@ -1,5 +1,10 @@
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
 from django.shortcuts import render
 
+from core import metrics as request_metrics
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +20,18 @@ def forbidden_error(request, exception):
 
 def internal_server_error(request):
     return render(request, 'core/500.html', {'path': request.path}, status=500)
+
+
+def metrics(request):
+    """Метрики только для адресов из METRICS_ALLOWED_IPS.
+
+    За обратным прокси на той же машине REMOTE_ADDR у всех запросов
+    127.0.0.1, поэтому запрос с X-Forwarded-For считается внешним.
+    """
+    if (request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS
+            or 'HTTP_X_FORWARDED_FOR' in request.META):
+        raise PermissionDenied
+    return HttpResponse(
+        request_metrics.render(),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
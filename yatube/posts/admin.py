@@ -1,28 +1,82 @@
+from core.paginator import EstimatedCountPaginator
 from django.contrib import admin
+from django.contrib.admin.widgets import ForeignKeyRawIdWidget
+from django.contrib.auth.admin import UserAdmin
+from django.db.models.expressions import RawSQL
 
-from .models import Comment, Group, Post
+from . import search
+from .deletion import delete_later
+from .models import Comment, Deletion, Group, Post, User, UserCounters
 
 
-class PostAdmin(admin.ModelAdmin):
+class RawIdWidget(ForeignKeyRawIdWidget):
+    """Поле id без подписи: подпись стоила бы запроса на каждую строку."""
+
+    def label_and_url_for_value(self, value):
+        return '', ''
+
+
+class DeleteLaterMixin:
+    """Удаление из админки через фоновую очередь posts.deletion."""
+
+    def get_deleted_objects(self, objs, request):
+        # Список каскада на странице подтверждения собирал бы в память
+        # все зависимые строки, ради чего и затеяно фоновое удаление
+        return [str(obj) for obj in objs], {}, set(), []
+
+    def delete_model(self, request, obj):
+        delete_later(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            delete_later(obj)
+
+
+class PostAdmin(DeleteLaterMixin, admin.ModelAdmin):
     list_display = (
         'pk',
         'text',
         'pub_date',
+        'updated',
         'author',
-        'group'
+        'group',
+        'comments_count'
     )
     list_filter = ('pub_date',)
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
+    date_hierarchy = 'pub_date'
+    autocomplete_fields = ('author', 'group')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
+    def get_changelist_form(self, request, **kwargs):
+        # Автодополнение в list_editable делает запрос на каждую строку
+        kwargs.setdefault('widgets', {
+            'group': RawIdWidget(
+                Post._meta.get_field('group').remote_field, self.admin_site)
+        })
+        return super().get_changelist_form(request, **kwargs)
+
+    def get_search_results(self, request, queryset, search_term):
+        query = search.build_query(search_term)
+        if not query or not search.is_available():
+            return super().get_search_results(
+                request, queryset, search_term)
+        queryset = queryset.filter(
+            pk__in=RawSQL(search.match_sql(search.POST), [query]))
+        return queryset, False
 
-class GroupAdmin(admin.ModelAdmin):
+
+class GroupAdmin(DeleteLaterMixin, admin.ModelAdmin):
     list_display = (
         'title',
         'slug',
         'description'
     )
+    search_fields = ('title', 'slug')
 
 
 class CommentAdmin(admin.ModelAdmin):
@@ -30,10 +84,59 @@ class CommentAdmin(admin.ModelAdmin):
         'post',
         'author',
         'text',
-        'created'
+        'created',
+        'updated'
+    )
+    list_select_related = ('post', 'author')
+    autocomplete_fields = ('post', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+class UserCountersAdmin(admin.ModelAdmin):
+    list_display = (
+        'user',
+        'posts_count',
+        'followers_count',
+        'following_count'
+    )
+    readonly_fields = (
+        'user',
+        'posts_count',
+        'followers_count',
+        'following_count'
+    )
+    search_fields = ('user__username',)
+
+
+class DeletingUserAdmin(DeleteLaterMixin, UserAdmin):
+    pass
+
+
+class DeletionAdmin(admin.ModelAdmin):
+    list_display = (
+        'kind',
+        'object_id',
+        'created',
+        'finished',
+        'step',
+        'removed'
+    )
+    list_filter = ('kind',)
+    readonly_fields = (
+        'kind',
+        'object_id',
+        'created',
+        'finished',
+        'step',
+        'removed'
     )
 
 
+admin.site.unregister(User)
+admin.site.register(User, DeletingUserAdmin)
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
+admin.site.register(UserCounters, UserCountersAdmin)
+admin.site.register(Deletion, DeletionAdmin)
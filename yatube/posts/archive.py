@@ -0,0 +1,94 @@
+"""Перенос старых постов в архивные таблицы.
+
+Почти все запросы читают посты последних недель, поэтому посты старше
+ARCHIVE_AFTER_DAYS вместе с комментариями переносятся в ArchivedPost и
+ArchivedComment. Таблица Post и её индексы остаются небольшими, а ленты
+и страница поста дочитывают архив, когда живые посты закончились
+(см. posts.utils.cursor_paginator).
+"""
+from datetime import timedelta
+
+from core import pagecache
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .bulk import chunked, raw_delete
+from .caching import bump_generations, post_scopes
+from .models import (ArchivedComment, ArchivedPost, Comment, Post,
+                     TimelineEntry)
+
+
+def archive_cutoff(days=None):
+    if days is None:
+        days = settings.ARCHIVE_AFTER_DAYS
+    return timezone.now() - timedelta(days=days)
+
+
+def _archive_comments(post_ids):
+    comments = Comment.objects.filter(post_id__in=post_ids).order_by()
+    for chunk in chunked(comments.iterator(), 500):
+        ArchivedComment.objects.bulk_create([
+            ArchivedComment(
+                id=comment.pk,
+                post_id=comment.post_id,
+                author_id=comment.author_id,
+                text=comment.text,
+                created=comment.created,
+                updated=comment.updated,
+            )
+            for comment in chunk
+        ])
+    raw_delete(comments)
+
+
+@transaction.atomic
+def archive_batch(cutoff, size):
+    """Переносит до size самых старых постов до cutoff, возвращает число."""
+    posts = list(
+        Post.objects.filter(pub_date__lt=cutoff)
+        .order_by('pub_date', 'pk')[:size])
+    if not posts:
+        return 0
+    pks = [post.pk for post in posts]
+    ArchivedPost.objects.bulk_create([
+        ArchivedPost(
+            id=post.pk,
+            text=post.text,
+            author_id=post.author_id,
+            group_id=post.group_id,
+            image=post.image.name,
+            pub_date=post.pub_date,
+            updated=post.updated,
+            comments_count=post.comments_count,
+        )
+        for post in posts
+    ])
+    _archive_comments(pks)
+    raw_delete(TimelineEntry.objects.filter(post_id__in=pks))
+    raw_delete(Post.all_objects.filter(pk__in=pks))
+    scopes = set()
+    for post in posts:
+        scopes.update(post_scopes(post.author_id, post.group_id))
+    bump_generations(*scopes)
+    return len(posts)
+
+
+def archive_posts(cutoff=None, batch_size=None, progress=None):
+    """Архивирует все посты старше cutoff пачками.
+
+    progress(archived) вызывается после каждой пачки.
+    """
+    cutoff = cutoff or archive_cutoff()
+    size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    archived = 0
+    while True:
+        moved = archive_batch(cutoff, size)
+        archived += moved
+        if moved and progress is not None:
+            progress(archived)
+        if moved < size:
+            break
+    if archived:
+        pagecache.purge_all()
+    return archived
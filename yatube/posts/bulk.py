@@ -0,0 +1,93 @@
+"""Помощники для массовой загрузки данных через bulk_create.
+
+bulk_create не отправляет сигналы, поэтому после seed_data счётчики,
+ленты подписок и поисковый индекс пересобираются целиком
+(rebuild_derived). import_data обновляет их только для затронутых
+объектов.
+"""
+from collections import OrderedDict
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.cache import cache
+from django.db import router
+
+from .counters import recount_all
+from .models import User
+from .search import rebuild as rebuild_search_index
+from .timeline import rebuild_timeline
+
+
+@contextmanager
+def keep_dates(*fields):
+    """Отключает auto_now_add, чтобы сохранить переданные даты."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def chunked(iterable, size):
+    """Разбивает поток на списки длиной не больше size."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def raw_delete(queryset):
+    """DELETE одним запросом, без сборщика каскада и сигналов.
+
+    Зависимые строки вызывающий код удаляет или переносит сам.
+    Возвращает число удалённых строк.
+    """
+    return queryset._raw_delete(
+        queryset._db or router.db_for_write(queryset.model))
+
+
+class Lookup:
+    """Соответствие значения поля и id с ограниченным числом записей.
+
+    Недостающие значения запрашиваются одним запросом на пачку,
+    давно не использованные вытесняются.
+    """
+
+    def __init__(self, queryset, field, maxsize=100000):
+        self.queryset = queryset
+        self.field = field
+        self.maxsize = maxsize
+        self.ids = OrderedDict()
+
+    def resolve(self, values):
+        values = set(filter(None, values))
+        missing = [value for value in values if value not in self.ids]
+        for chunk in chunked(missing, 500):
+            self.ids.update(
+                self.queryset.filter(**{f'{self.field}__in': chunk})
+                .values_list(self.field, 'pk')
+            )
+        found = {}
+        for value in values:
+            if value in self.ids:
+                self.ids.move_to_end(value)
+                found[value] = self.ids[value]
+        while len(self.ids) > self.maxsize:
+            self.ids.popitem(last=False)
+        return found
+
+
+def rebuild_derived(followers=None):
+    """Пересчитывает данные, которые обычно обновляют сигналы."""
+    if followers is None:
+        followers = User.objects.all()
+    recount_all()
+    followers = followers.filter(follower__isnull=False).distinct()
+    for user in followers.iterator():
+        rebuild_timeline(user)
+    rebuild_search_index()
+    cache.clear()
@@ -0,0 +1,169 @@
+import time
+from datetime import datetime, timezone
+from functools import wraps
+
+from core import pagecache
+from core.db_router import stick_to_primary
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.urls import reverse
+
+from .models import Group, User
+
+FEED_SCOPE = 'feed'
+
+
+def group_scope(group_id):
+    return 'group:{}'.format(group_id)
+
+
+def author_scope(author_id):
+    return 'author:{}'.format(author_id)
+
+
+def post_scope(post_id):
+    return 'post:{}'.format(post_id)
+
+
+def also_on_commit(invalidate):
+    """Выполняет сброс кэша сразу и ещё раз после COMMIT.
+
+    Пока транзакция не завершилась, параллельный запрос читает старые
+    строки и может снова положить их в кэш уже после первого сброса.
+    Повторный сброс из on_commit убирает такую запись.
+    """
+    @wraps(invalidate)
+    def wrapper(*args):
+        invalidate(*args)
+        if transaction.get_connection().in_atomic_block:
+            transaction.on_commit(lambda: invalidate(*args))
+    return wrapper
+
+
+def _generation_key(scope):
+    return 'generation:{}'.format(scope)
+
+
+def _modified_key(scope):
+    return 'modified:{}'.format(scope)
+
+
+def _initial_generation():
+    # Начинаем со времени, а не с единицы: если счётчик вытеснят из кэша,
+    # новое поколение не совпадёт ни с одним из старых фрагментов.
+    return int(time.time() * 1000)
+
+
+def get_generations(*scopes):
+    """Текущие поколения для набора областей одной строкой."""
+    keys = [_generation_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    for scope, key in zip(scopes, keys):
+        if key not in values:
+            cache.add(key, _initial_generation(), None)
+            cache.add(_modified_key(scope), time.time(), None)
+            values[key] = cache.get(key)
+    return '.'.join(str(values[key]) for key in keys)
+
+
+@also_on_commit
+def bump_generations(*scopes):
+    """Делает недействительными фрагменты, зависящие от этих областей."""
+    cache.set_many(
+        {_modified_key(scope): time.time() for scope in scopes}, None)
+    for scope in scopes:
+        key = _generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_generation(), None)
+
+
+def get_modified(*scopes):
+    """Время последнего изменения областей или None, если оно неизвестно."""
+    keys = [_modified_key(scope) for scope in scopes]
+    values = cache.get_many(keys)
+    if len(values) < len(keys):
+        return None
+    return datetime.fromtimestamp(max(values.values()), timezone.utc)
+
+
+def post_scopes(author_id, *group_ids):
+    scopes = [FEED_SCOPE, author_scope(author_id)]
+    scopes.extend(group_scope(group_id) for group_id in group_ids if group_id)
+    return scopes
+
+
+def feed_cache_context(request, *scopes):
+    """Контекст для {% cache %} ленты.
+
+    Ключ фрагмента складывается из поколений областей и параметров
+    страницы, поэтому TTL можно держать большим. Если поколение сменилось
+    недавно, реплика может ещё не видеть изменение, а фрагмент под новым
+    поколением проживёт весь TTL, поэтому страница читается с default.
+    """
+    modified = get_modified(*scopes)
+    if modified is None or (
+            time.time() - modified.timestamp()
+            < settings.REPLICA_STICKY_SECONDS):
+        stick_to_primary()
+    return {
+        'feed_cache_timeout': settings.FEED_CACHE_TIMEOUT,
+        'feed_cache_vary': '{}:{}'.format(
+            get_generations(*scopes), request.GET.urlencode()),
+    }
+
+
+def purge_post_pages(post_id, author_id, *group_ids):
+    """Сбрасывает кэш анонимных страниц, на которых виден пост."""
+    paths = [
+        reverse('posts:index'),
+        reverse('posts:post_detail', kwargs={'post_id': post_id}),
+    ]
+    username = User.objects.filter(pk=author_id).values_list(
+        'username', flat=True).first()
+    if username is not None:
+        paths.append(reverse('posts:profile', kwargs={'username': username}))
+    slugs = Group.objects.filter(
+        pk__in=[group_id for group_id in group_ids if group_id]
+    ).values_list('slug', flat=True)
+    paths.extend(
+        reverse('posts:group_list', kwargs={'slug': slug}) for slug in slugs)
+    pagecache.purge(*paths)
+
+
+def _card_key(post_id):
+    return 'post_card:{}'.format(post_id)
+
+
+def _card_version(post):
+    return '{}:{}'.format(post.updated.timestamp(), post.comments_count)
+
+
+def get_cards(posts):
+    """HTML карточек постов из кэша одним запросом: {id: html}.
+
+    Карточка хранится вместе с версией поста (время изменения и число
+    комментариев), устаревшие версии считаются промахом.
+    """
+    cached = cache.get_many([_card_key(post.pk) for post in posts])
+    cards = {}
+    for post in posts:
+        value = cached.get(_card_key(post.pk))
+        if value is not None and value[0] == _card_version(post):
+            cards[post.pk] = value[1]
+    return cards
+
+
+def set_cards(cards):
+    """Сохраняет карточки, cards - пары (пост, html)."""
+    cache.set_many(
+        {_card_key(post.pk): (_card_version(post), html)
+         for post, html in cards},
+        settings.POST_CARD_CACHE_TIMEOUT
+    )
+
+
+def forget_cards(post_ids):
+    cache.delete_many([_card_key(post_id) for post_id in post_ids])
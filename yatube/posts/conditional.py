@@ -0,0 +1,78 @@
+"""Условные GET для лент и страницы поста.
+
+ETag и Last-Modified берутся из поколений и времени изменения областей
+кэша (см. posts.caching), поэтому для ответа 304 не нужны ни запросы
+ленты, ни рендеринг шаблона.
+
+Max('updated') по постам области сюда не подходит. Новый комментарий
+меняет только comments_count, подписка - счётчики в шапке профиля,
+удаление или перенос в архив не самого нового поста не меняет максимум.
+Все эти изменения сдвигают поколение, а updated постов - нет, и
+клиент получил бы 304 на устаревшую страницу. Если поколение вытеснено
+из кэша, оно создаётся заново от текущего времени: клиент в худшем
+случае получит лишний ответ 200, но не устаревший 304.
+"""
+import hashlib
+
+from django.views.decorators.http import condition
+
+from .caching import (FEED_SCOPE, author_scope, get_generations,
+                      get_modified, group_scope, post_scope)
+from .models import ArchivedPost, Group, Post, User
+
+
+def index_scopes():
+    return [FEED_SCOPE]
+
+
+def group_scopes(slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+    return group_id and [group_scope(group_id)]
+
+
+def profile_scopes(username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+    return author_id and [author_scope(author_id)]
+
+
+def post_detail_scopes(post_id):
+    for model in (Post, ArchivedPost):
+        post = model.objects.filter(pk=post_id).values(
+            'author_id', 'group_id').first()
+        if post is not None:
+            break
+    else:
+        return None
+    scopes = [post_scope(post_id), author_scope(post['author_id'])]
+    if post['group_id']:
+        scopes.append(group_scope(post['group_id']))
+    return scopes
+
+
+def conditional_page(get_scopes):
+    """condition() с валидаторами по областям кэша страницы.
+
+    get_scopes получает аргументы view из URL и возвращает области
+    или None, если объекта нет: тогда view отработает и вернёт 404.
+    """
+    def scopes(request, kwargs):
+        if not hasattr(request, '_page_scopes'):
+            request._page_scopes = get_scopes(**kwargs)
+        return request._page_scopes
+
+    def etag(request, **kwargs):
+        page_scopes = scopes(request, kwargs)
+        if not page_scopes:
+            return None
+        user_id = request.user.pk if request.user.is_authenticated else ''
+        value = '{}|{}|{}'.format(
+            get_generations(*page_scopes), user_id, request.GET.urlencode())
+        return hashlib.md5(value.encode()).hexdigest()
+
+    def last_modified(request, **kwargs):
+        page_scopes = scopes(request, kwargs)
+        return get_modified(*page_scopes) if page_scopes else None
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
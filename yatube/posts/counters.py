@@ -0,0 +1,148 @@
+from core.db_router import read_from_primary
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .caching import also_on_commit
+from .models import (ArchivedComment, ArchivedPost, Comment, Follow, Post,
+                     User, UserCounters)
+
+
+def _count_subquery(queryset, field):
+    """Подзапрос COUNT(*) по field = OuterRef('pk'), 0 если строк нет."""
+    return Coalesce(
+        Subquery(
+            queryset
+            .filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0
+    )
+
+
+def recount_user(user_id):
+    """Пересчитывает счётчики пользователя по реальным данным."""
+    forget_profile_summary(user_id)
+    counters, _ = UserCounters.objects.update_or_create(
+        user_id=user_id,
+        defaults={
+            'posts_count': (
+                Post.objects.filter(author_id=user_id).count()
+                + ArchivedPost.objects.filter(author_id=user_id).count()),
+            'followers_count': Follow.objects.filter(
+                author_id=user_id).count(),
+            'following_count': Follow.objects.filter(
+                user_id=user_id).count(),
+        }
+    )
+    return counters
+
+
+def get_user_counters(user):
+    """Счётчики пользователя; строка создаётся при первом обращении."""
+    try:
+        return user.counters
+    except UserCounters.DoesNotExist:
+        return recount_user(user.pk)
+
+
+def bump_user(user_id, field, delta):
+    forget_profile_summary(user_id)
+    updated = UserCounters.objects.filter(user_id=user_id).update(
+        **{field: F(field) + delta})
+    # Уменьшать отсутствующий счётчик незачем: его пересчитает
+    # get_user_counters, а при каскадном удалении пользователя
+    # создавать строку заново нельзя.
+    if not updated and delta > 0:
+        recount_user(user_id)
+
+
+def bump_post_comments(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=F('comments_count') + delta)
+
+
+def recount_comments(post_ids):
+    """Пересчитывает comments_count у постов post_ids."""
+    Post.objects.filter(pk__in=post_ids).update(
+        comments_count=_count_subquery(Comment.objects.all(), 'post'))
+
+
+def recount_all():
+    """Чинит все счётчики одним UPDATE на таблицу."""
+    existing = UserCounters.objects.values('user_id')
+    UserCounters.objects.bulk_create(
+        [
+            UserCounters(user_id=user_id)
+            for user_id in User.objects.exclude(pk__in=existing)
+            .values_list('pk', flat=True).iterator()
+        ],
+        batch_size=1000,
+        ignore_conflicts=True
+    )
+    UserCounters.objects.update(
+        posts_count=(
+            _count_subquery(Post.objects.all(), 'author')
+            + _count_subquery(ArchivedPost.objects.all(), 'author')),
+        followers_count=_count_subquery(Follow.objects.all(), 'author'),
+        following_count=_count_subquery(Follow.objects.all(), 'user'),
+    )
+    Post.objects.update(
+        comments_count=_count_subquery(Comment.objects.all(), 'post'))
+    ArchivedPost.objects.update(
+        comments_count=_count_subquery(
+            ArchivedComment.objects.all(), 'post'))
+
+
+def _summary_key(user_id):
+    return 'profile_summary:{}'.format(user_id)
+
+
+@also_on_commit
+def forget_profile_summary(*user_ids):
+    cache.delete_many([_summary_key(user_id) for user_id in user_ids])
+
+
+def _latest_pub_date(model):
+    return Subquery(
+        model.objects
+        .filter(author_id=OuterRef('pk'))
+        .order_by('-pub_date')
+        .values('pub_date')[:1]
+    )
+
+
+def get_profile_summary(author, followed):
+    """Шапка профиля: счётчики, последний пост и подписан ли зритель.
+
+    followed - подписки зрителя из posts.follows.get_followed. Общая
+    для всех зрителей часть лежит в кэше, пока bump_user не сообщит об
+    изменении постов или подписок, промах стоит одного запроса.
+    """
+    key = _summary_key(author.pk)
+    summary = cache.get(key)
+    if summary is None:
+        with read_from_primary():
+            summary = User.objects.filter(pk=author.pk).annotate(
+                posts_count=F('counters__posts_count'),
+                followers_count=F('counters__followers_count'),
+                following_count=F('counters__following_count'),
+                latest_post=Coalesce(
+                    _latest_pub_date(Post), _latest_pub_date(ArchivedPost)),
+            ).values(
+                'posts_count', 'followers_count', 'following_count',
+                'latest_post'
+            ).get()
+        if summary['posts_count'] is None:
+            counters = recount_user(author.pk)
+            summary.update(
+                posts_count=counters.posts_count,
+                followers_count=counters.followers_count,
+                following_count=counters.following_count,
+            )
+        cache.set(key, summary, settings.PROFILE_SUMMARY_TIMEOUT)
+    return dict(summary, following=author.pk in followed)
@@ -0,0 +1,242 @@
+"""Фоновое удаление постов, групп и пользователей.
+
+Каскадный delete() собирает все связанные объекты в память и держит
+запись в SQLite заблокированной до конца. Здесь объект сначала
+помечается удаляемым и сразу пропадает из лент, а связанные строки
+удаляются пачками по DELETION_BATCH_SIZE, каждая в своей короткой
+транзакции. Шаги идемпотентны: прерванное удаление продолжает команда
+process_deletions.
+"""
+from collections import Counter
+
+from core import pagecache
+from core.tasks import defer
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import search
+from .bulk import chunked, raw_delete
+from .caching import (FEED_SCOPE, author_scope, bump_generations,
+                      group_scope, post_scope, post_scopes, purge_post_pages)
+from .counters import bump_user, forget_profile_summary
+from .follows import forget_followed
+from .models import (ArchivedComment, ArchivedPost, Comment, Deletion,
+                     Follow, Group, Post, TimelineEntry, User, UserCounters)
+
+
+def _delete(model, pks):
+    # Зависимые строки к этому моменту уже удалены предыдущими шагами,
+    # а счётчики шаги поправляют сами
+    return raw_delete(model._base_manager.filter(pk__in=pks))
+
+
+def _delete_rows(queryset, size):
+    pks = list(queryset.order_by().values_list('pk', flat=True)[:size])
+    if pks:
+        _delete(queryset.model, pks)
+    return len(pks)
+
+
+def _delete_comments(queryset, size):
+    """Удаляет комментарии и уменьшает счётчики их постов."""
+    rows = list(queryset.order_by().values_list('pk', 'post_id')[:size])
+    if not rows:
+        return 0
+    _delete(queryset.model, [pk for pk, _ in rows])
+    posts = queryset.model._meta.get_field('post').related_model
+    per_post = Counter(post_id for _, post_id in rows)
+    for post_id, count in per_post.items():
+        posts.all_objects.filter(pk=post_id).update(
+            comments_count=F('comments_count') - count)
+    bump_generations(*(post_scope(post_id) for post_id in per_post))
+    return len(rows)
+
+
+def _delete_follows(queryset, size, other, field):
+    """Удаляет подписки и уменьшает счётчик field у второй стороны."""
+    rows = list(
+        queryset.order_by().values_list('pk', other, 'user_id')[:size])
+    if not rows:
+        return 0
+    _delete(Follow, [pk for pk, _, _ in rows])
+    forget_followed(*{follower for _, _, follower in rows})
+    user_ids = {user_id for _, user_id, _ in rows}
+    for user_id in user_ids:
+        UserCounters.objects.filter(user_id=user_id).update(
+            **{field: F(field) - 1})
+    forget_profile_summary(*user_ids)
+    bump_generations(*(author_scope(user_id) for user_id in user_ids))
+    return len(rows)
+
+
+def _detach_group_posts(queryset, size):
+    rows = list(queryset.order_by().values_list('pk', 'author_id')[:size])
+    if not rows:
+        return 0
+    pks = [pk for pk, _ in rows]
+    posts = queryset.model
+    posts.all_objects.filter(pk__in=pks).touch(group=None)
+    for post in posts.objects.filter(pk__in=pks).select_related('author'):
+        search.index_post(post)
+    bump_generations(*{author_scope(author_id) for _, author_id in rows})
+    return len(rows)
+
+
+def _delete_posts(queryset, size):
+    pks = list(queryset.order_by().values_list('pk', flat=True)[:size])
+    if pks:
+        _delete(queryset.model, pks)
+        search.remove_posts(pks)
+    return len(pks)
+
+
+def _delete_object(queryset):
+    """Последний шаг: обычный delete(), каскаду уже нечего собирать."""
+    obj = queryset.first()
+    if obj is None:
+        return 0
+    obj.delete()
+    return 1
+
+
+STEPS = {
+    Deletion.POST: (
+        ('timeline', lambda pk, size: _delete_rows(
+            TimelineEntry.objects.filter(post_id=pk), size)),
+        ('comments', lambda pk, size: _delete_comments(
+            Comment.objects.filter(post_id=pk), size)),
+        ('post', lambda pk, size: _delete_object(
+            Post.all_objects.filter(pk=pk))),
+    ),
+    Deletion.GROUP: (
+        ('posts', lambda pk, size: _detach_group_posts(
+            Post.all_objects.filter(group_id=pk), size)),
+        ('archived_posts', lambda pk, size: _detach_group_posts(
+            ArchivedPost.all_objects.filter(group_id=pk), size)),
+        ('group', lambda pk, size: _delete_object(
+            Group.all_objects.filter(pk=pk))),
+    ),
+    Deletion.USER: (
+        ('comments', lambda pk, size: _delete_comments(
+            Comment.objects.filter(author_id=pk), size)),
+        ('post_comments', lambda pk, size: _delete_comments(
+            Comment.objects.filter(post__author_id=pk), size)),
+        ('timeline', lambda pk, size: _delete_rows(
+            TimelineEntry.objects.filter(user_id=pk), size)),
+        ('follower_timelines', lambda pk, size: _delete_rows(
+            TimelineEntry.objects.filter(author_id=pk), size)),
+        ('following', lambda pk, size: _delete_follows(
+            Follow.objects.filter(user_id=pk), size,
+            'author_id', 'followers_count')),
+        ('followers', lambda pk, size: _delete_follows(
+            Follow.objects.filter(author_id=pk), size,
+            'user_id', 'following_count')),
+        ('posts', lambda pk, size: _delete_posts(
+            Post.all_objects.filter(author_id=pk), size)),
+        ('archived_comments', lambda pk, size: _delete_comments(
+            ArchivedComment.objects.filter(author_id=pk), size)),
+        ('archived_post_comments', lambda pk, size: _delete_comments(
+            ArchivedComment.objects.filter(post__author_id=pk), size)),
+        ('archived_posts', lambda pk, size: _delete_posts(
+            ArchivedPost.all_objects.filter(author_id=pk), size)),
+        ('user', lambda pk, size: _delete_object(
+            User.objects.filter(pk=pk))),
+    ),
+}
+
+
+def _hide_post(post):
+    hidden = Post.all_objects.filter(
+        pk=post.pk, is_deleted=False).touch(is_deleted=True)
+    if hidden:
+        # Скрытый пост уже не считается (см. recount_user), поэтому
+        # счётчик уменьшается сейчас, а не сигналом на последнем шаге
+        bump_user(post.author_id, 'posts_count', -1)
+    bump_generations(
+        post_scope(post.pk), *post_scopes(post.author_id, post.group_id))
+    purge_post_pages(post.pk, post.author_id, post.group_id)
+    search.remove_post(post.pk)
+
+
+def _hide_group(group):
+    Group.all_objects.filter(pk=group.pk).update(is_deleted=True)
+    bump_generations(FEED_SCOPE, group_scope(group.pk))
+    pagecache.purge_all()
+    search.remove_group(group.pk)
+
+
+def _hide_user(user):
+    User.objects.filter(pk=user.pk).update(is_active=False)
+    group_ids = set()
+    for model in (Post, ArchivedPost):
+        posts = model.all_objects.filter(author_id=user.pk)
+        group_ids.update(
+            posts.exclude(group=None).order_by().values_list(
+                'group_id', flat=True).distinct())
+        # Скрытые посты не должны находиться поиском до шага posts
+        post_ids = posts.order_by().values_list('pk', flat=True)
+        for chunk in chunked(post_ids.iterator(), 500):
+            search.remove_posts(chunk)
+        posts.touch(is_deleted=True)
+    bump_generations(*post_scopes(user.pk, *group_ids))
+    pagecache.purge_all()
+    search.remove_author(user.pk)
+
+
+HIDE = {
+    Deletion.POST: _hide_post,
+    Deletion.GROUP: _hide_group,
+    Deletion.USER: _hide_user,
+}
+KIND_BY_MODEL = {
+    Post: Deletion.POST,
+    Group: Deletion.GROUP,
+    User: Deletion.USER,
+}
+
+
+def delete_later(obj, background=True):
+    """Сразу скрывает объект и ставит его удаление в очередь.
+
+    При background=True удаление запускается фоновой задачей, иначе
+    его выполнит process_deletions.
+    """
+    kind = KIND_BY_MODEL[type(obj)]
+    with transaction.atomic():
+        HIDE[kind](obj)
+        deletion, _ = Deletion.objects.get_or_create(
+            kind=kind, object_id=obj.pk, finished__isnull=True)
+        if background:
+            defer(run_deletion, deletion.pk)
+    return deletion
+
+
+def run_deletion(deletion_id, batch_size=None, progress=None):
+    """Выполняет оставшиеся шаги удаления.
+
+    progress(deletion) вызывается после каждой пачки.
+    """
+    deletion = Deletion.objects.filter(
+        pk=deletion_id, finished__isnull=True).first()
+    if deletion is None:
+        return
+    size = batch_size or settings.DELETION_BATCH_SIZE
+    for name, step in STEPS[deletion.kind]:
+        deletion.step = name
+        while True:
+            with transaction.atomic():
+                removed = step(deletion.object_id, size)
+                Deletion.objects.filter(pk=deletion.pk).update(
+                    step=name, removed=F('removed') + removed)
+            deletion.removed += removed
+            if progress is not None:
+                progress(deletion)
+            if removed < size:
+                break
+    # Карточки и счётчики на закэшированных страницах могли устареть
+    pagecache.purge_all()
+    deletion.finished = timezone.now()
+    deletion.step = ''
+    deletion.save(update_fields=['finished', 'step'])
@@ -0,0 +1,64 @@
+"""Потоковая выгрузка постов в JSONL и CSV.
+
+Посты читаются пачками по первичному ключу (keyset), поэтому память
+не растёт с объёмом выгрузки, а первая строка уходит клиенту сразу.
+Перенесённые в архив посты выгружаются тем же способом перед живыми:
+они старше, так что id по-прежнему идут по возрастанию.
+"""
+import csv
+import json
+
+FIELDS = ('id', 'pub_date', 'updated', 'author', 'group', 'text', 'image',
+          'comments_count')
+FORMATS = {
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+CHUNK_SIZE = 2000
+
+
+def iter_rows(posts, chunk_size=CHUNK_SIZE, archive=None):
+    """Словари с полями FIELDS: сначала архивные посты, затем живые."""
+    if archive is not None:
+        yield from _iter_rows(archive, chunk_size)
+    yield from _iter_rows(posts, chunk_size)
+
+
+def _iter_rows(posts, chunk_size):
+    posts = posts.order_by('pk').values_list(
+        'pk', 'pub_date', 'updated', 'author__username', 'group__slug', 'text',
+        'image', 'comments_count')
+    last_pk = 0
+    while True:
+        chunk = list(posts.filter(pk__gt=last_pk)[:chunk_size])
+        for values in chunk:
+            row = dict(zip(FIELDS, values))
+            row['pub_date'] = row['pub_date'].isoformat()
+            row['updated'] = row['updated'].isoformat()
+            yield row
+        if len(chunk) < chunk_size:
+            return
+        last_pk = chunk[-1][0]
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def jsonl_lines(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+def csv_lines(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        yield writer.writerow(
+            ['' if row[field] is None else row[field] for field in FIELDS])
+
+
+def export_lines(posts, fmt, chunk_size=CHUNK_SIZE, archive=None):
+    lines = csv_lines if fmt == 'csv' else jsonl_lines
+    return lines(iter_rows(posts, chunk_size, archive))
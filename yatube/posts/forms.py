@@ -1,5 +1,9 @@
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
 from django.forms import ModelForm
+from django.template.defaultfilters import filesizeformat
 
+from .images import check_pixels, downscale
 from .models import Comment, Post
 
 
@@ -9,6 +13,24 @@ class PostForm(ModelForm):
         fields = ['text', 'group', 'image']
         exclude = ['author']
 
+    def __init__(self, *args, rejected_uploads=(), **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rejected_uploads = rejected_uploads
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            check_pixels(image)
+            image = downscale(image)
+        return image
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if 'image' in self.rejected_uploads:
+            self.add_error('image', 'Файл больше {}.'.format(
+                filesizeformat(settings.UPLOAD_MAX_BYTES)))
+        return cleaned_data
+
 
 class CommentForm(ModelForm):
     class Meta:
@@ -0,0 +1,53 @@
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import InMemoryUploadedFile
+from PIL import Image, ImageOps
+
+
+def check_pixels(image_file):
+    """Проверяет размер картинки по заголовку, не декодируя пиксели."""
+    image_file.seek(0)
+    with Image.open(image_file) as image:
+        width, height = image.size
+    image_file.seek(0)
+    if width * height > settings.POST_IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Слишком большая картинка: %(width)s×%(height)s пикселей.',
+            params={'width': width, 'height': height},
+            code='too_many_pixels'
+        )
+
+
+def downscale(image_file):
+    """Уменьшает картинку до POST_IMAGE_MAX_SIDE и перекодирует её.
+
+    EXIF и прочие метаданные не переносятся, поворот из EXIF применяется
+    к пикселям. JPEG декодируется сразу в уменьшенном масштабе (draft),
+    так что память зависит от итогового размера, а не от исходного.
+    """
+    max_side = settings.POST_IMAGE_MAX_SIDE
+    image_file.seek(0)
+    with Image.open(image_file) as image:
+        image.draft('RGB', (max_side, max_side))
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA') or (
+            image.mode == 'P' and 'transparency' in image.info)
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+        output = BytesIO()
+        if has_alpha:
+            image_format, extension = 'PNG', 'png'
+            image.save(output, image_format, optimize=True)
+        else:
+            image_format, extension = 'JPEG', 'jpg'
+            image.save(output, image_format,
+                       quality=settings.POST_IMAGE_QUALITY,
+                       optimize=True, progressive=True)
+    name = '{}.{}'.format(os.path.splitext(image_file.name)[0], extension)
+    return InMemoryUploadedFile(
+        output, 'image', name, 'image/' + image_format.lower(),
+        output.tell(), None
+    )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from posts.archive import archive_cutoff, archive_posts
+
+
+class Command(BaseCommand):
+    help = 'Переносит старые посты с комментариями в архивные таблицы'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int,
+            help='Возраст поста в днях (по умолчанию ARCHIVE_AFTER_DAYS)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Сколько постов переносить в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        archived = archive_posts(
+            archive_cutoff(options['days']), options['batch_size'],
+            progress=self.progress)
+        self.stdout.write(f'Перенесено в архив постов: {archived}')
+
+    def progress(self, archived):
+        self.stderr.write(f'  перенесено {archived}')
@@ -0,0 +1,140 @@
+import shutil
+import tempfile
+import time
+
+from core.test_runner import temporary_cache
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Follow, Group, Post
+
+User = get_user_model()
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = int(round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def dataset(size):
+    """Объёмы seed_data для заданного числа постов."""
+    users = max(10, size // 20)
+    return {
+        'posts': size,
+        'users': users,
+        'groups': max(2, size // 200),
+        'comments': size * 2,
+        'follows': users * 10,
+        'images': min(20, max(1, size // 10)),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Измеряет время ответа и число SQL-запросов основных страниц '
+        'на синтетических данных разного объёма'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', default='1000,10000',
+            help='Число постов в наборах данных через запятую'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=30,
+            help='Сколько раз запрашивать каждую страницу'
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--current-db', action='store_true',
+            help='Мерить на текущей базе, не создавая временные'
+        )
+
+    def handle(self, *args, **options):
+        # Замеры сбрасывают кэш, общий кэш сервера они не трогают
+        with temporary_cache():
+            self.measure(options)
+
+    def measure(self, options):
+        self.write_header()
+        if options['current_db']:
+            self.run(options, size='current')
+            return
+        for size in (int(size) for size in options['sizes'].split(',')):
+            old_name = connection.settings_dict['NAME']
+            media_root = tempfile.mkdtemp()
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                with override_settings(MEDIA_ROOT=media_root):
+                    call_command(
+                        'seed_data', seed=options['seed'],
+                        stdout=self.stderr, **dataset(size))
+                    self.run(options, size=size)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                shutil.rmtree(media_root, ignore_errors=True)
+
+    def pages(self):
+        post = Post.objects.order_by('-comments_count').first()
+        group = Group.objects.order_by('pk').first()
+        follow = Follow.objects.order_by('pk').first()
+        pages = [('posts:index', reverse('posts:index'), None)]
+        if group is not None:
+            pages.append((
+                'posts:group_list',
+                reverse('posts:group_list', kwargs={'slug': group.slug}),
+                None))
+        if post is not None:
+            pages.append((
+                'posts:profile',
+                reverse('posts:profile',
+                        kwargs={'username': post.author.username}),
+                None))
+            pages.append((
+                'posts:post_detail',
+                reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+                None))
+        if follow is not None:
+            pages.append((
+                'posts:follow_index', reverse('posts:follow_index'),
+                follow.user))
+        return pages
+
+    def run(self, options, size):
+        for name, url, user in self.pages():
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            cache.clear()
+            timings = []
+            queries = []
+            for _ in range(options['requests']):
+                connection.queries_log.clear()
+                with CaptureQueriesContext(connection) as context:
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries.append(len(context.captured_queries))
+                if response.status_code != 200:
+                    self.stderr.write(
+                        f'{url} ответил {response.status_code}')
+            self.stdout.write(
+                '{:>8} {:<18} {:>8.1f} {:>8.1f} {:>8.1f} {:>8.1f} '
+                '{:>7} {:>7}'.format(
+                    size, name,
+                    percentile(timings, 50), percentile(timings, 95),
+                    percentile(timings, 99), timings[0],
+                    queries[0], percentile(queries, 50)))
+
+    def write_header(self):
+        self.stdout.write(
+            '{:>8} {:<18} {:>8} {:>8} {:>8} {:>8} {:>7} {:>7}'.format(
+                'posts', 'view', 'p50 ms', 'p95 ms', 'p99 ms', 'cold ms',
+                'sql/1st', 'sql/p50'))
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.export import CHUNK_SIZE, FORMATS, export_lines
+from posts.models import ArchivedPost, Group, Post, User
+
+
+class Command(BaseCommand):
+    help = 'Потоково выгружает посты автора или группы в JSONL/CSV'
+
+    def add_arguments(self, parser):
+        source = parser.add_mutually_exclusive_group()
+        source.add_argument('--author', help='Имя пользователя автора')
+        source.add_argument('--group', help='Slug группы')
+        parser.add_argument(
+            '--format', choices=sorted(FORMATS), default='jsonl')
+        parser.add_argument(
+            '--changed-since',
+            help='Только посты, изменённые после этого момента (ISO 8601)'
+        )
+        parser.add_argument(
+            '--output', help='Файл для выгрузки (по умолчанию stdout)')
+        parser.add_argument(
+            '--chunk-size', type=int, default=CHUNK_SIZE,
+            help='Сколько постов читать одним запросом'
+        )
+
+    def handle(self, *args, **options):
+        if not (options['author'] or options['group']):
+            raise CommandError('Укажите --author или --group')
+        if options['author']:
+            owner = User.objects.filter(username=options['author']).first()
+            posts = Post.objects.filter(author=owner)
+            archive = ArchivedPost.objects.filter(author=owner)
+        else:
+            owner = Group.objects.filter(slug=options['group']).first()
+            posts = Post.objects.filter(group=owner)
+            archive = ArchivedPost.objects.filter(group=owner)
+        if owner is None:
+            raise CommandError('Автор или группа не найдены')
+        if options['changed_since']:
+            since = parse_datetime(options['changed_since'])
+            if since is None:
+                raise CommandError('Неверная дата в --changed-since')
+            if timezone.is_naive(since):
+                since = timezone.make_aware(since)
+            posts = posts.filter(updated__gt=since)
+            archive = archive.filter(updated__gt=since)
+        lines = export_lines(
+            posts, options['format'], options['chunk_size'], archive)
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8',
+                  newline='') as output:
+            output.writelines(lines)
@@ -0,0 +1,64 @@
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from core.tasks import get_process_executor
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.bulk import chunked
+from posts.models import ArchivedPost, Post
+from posts.thumbnails import generate_post_thumbnails
+
+
+class Command(BaseCommand):
+    help = 'Создаёт миниатюры для уже загруженных картинок постов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Число процессов (0 - в текущем процессе)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=100,
+            help='Сколько постов отдавать процессу за раз'
+        )
+
+    def handle(self, *args, **options):
+        batches = chunked(self.post_ids(), options['batch_size'])
+        processed = 0
+        if options['workers'] == 0:
+            for batch in batches:
+                generate_post_thumbnails(batch)
+                processed += len(batch)
+        else:
+            workers = (options['workers']
+                       or settings.BACKGROUND_PROCESS_WORKERS)
+            with get_process_executor(workers) as executor:
+                # map() сразу забрал бы все пачки, здесь в очереди пула
+                # не больше двух пачек на процесс
+                pending = set()
+                for batch in batches:
+                    if len(pending) >= workers * 2:
+                        done, pending = wait(
+                            pending, return_when=FIRST_COMPLETED)
+                        processed += sum(future.result() for future in done)
+                    pending.add(executor.submit(_generate, batch))
+                processed += sum(
+                    future.result() for future in wait(pending).done)
+        self.stdout.write(f'Обработано постов: {processed}')
+
+    def post_ids(self):
+        # id архивных постов совпадают с исходными и не пересекаются
+        # с живыми, поэтому обе таблицы идут в одном потоке
+        for model in (Post, ArchivedPost):
+            yield from (
+                model.objects
+                .exclude(image='')
+                .order_by('pk')
+                .values_list('pk', flat=True)
+                .iterator()
+            )
+
+
+def _generate(batch):
+    generate_post_thumbnails(batch)
+    return len(batch)
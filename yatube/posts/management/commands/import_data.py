@@ -0,0 +1,343 @@
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from core import pagecache
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import search
+from posts.bulk import Lookup, chunked, keep_dates
+from posts.caching import (author_scope, bump_generations, post_scope,
+                           post_scopes)
+from posts.counters import recount_comments, recount_user
+from posts.follows import forget_followed
+from posts.models import (ArchivedPost, Comment, Follow, Group, Post,
+                          TimelineEntry, User)
+from posts.timeline import backfill_timeline, trim_timeline
+
+MODELS = {'posts': Post, 'comments': Comment, 'follows': Follow}
+
+
+class SkipRow(Exception):
+    """Строка не загружается, аргумент - причина для отчёта."""
+
+
+def required(row, field):
+    value = row.get(field)
+    if isinstance(value, str):
+        value = value.strip()
+    if value in (None, ''):
+        raise SkipRow(f'нет поля {field}')
+    return value
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise SkipRow('неверная дата')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково загружает посты, комментарии или подписки из JSONL/CSV '
+        'пачками bulk_create'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Файл с данными, "-" - стандартный ввод')
+        parser.add_argument(
+            '--kind', required=True, choices=sorted(MODELS),
+            help='Что загружать'
+        )
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'),
+            help='Формат файла (по умолчанию по расширению)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Сколько строк записывать в одной транзакции'
+        )
+        parser.add_argument(
+            '--create-users', action='store_true',
+            help='Создавать неизвестных авторов без пароля'
+        )
+        parser.add_argument(
+            '--progress-every', type=float, default=5,
+            help='Как часто (в секундах) печатать прогресс'
+        )
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересчитывать счётчики, ленты и поисковый индекс'
+        )
+
+    def handle(self, *args, **options):
+        self.kind = options['kind']
+        self.create_users = options['create_users']
+        self.users = Lookup(User.objects.all(), 'username')
+        self.groups = Lookup(Group.objects.all(), 'slug')
+        self.skipped = Counter()
+        self.read = self.created = 0
+        build = getattr(self, f'build_{self.kind}')
+        refresh = getattr(self, f'refresh_{self.kind}')
+        model = MODELS[self.kind]
+        fmt = options['format'] or (
+            'csv' if options['path'].endswith('.csv') else 'jsonl')
+        started = reported = time.monotonic()
+        with self.open(options['path']) as source, keep_dates(
+                Post._meta.get_field('pub_date'),
+                Comment._meta.get_field('created')):
+            rows = self.read_csv(source) if fmt == 'csv' else (
+                self.read_jsonl(source))
+            for batch in chunked(rows, options['batch_size']):
+                self.read += len(batch)
+                batch_started = timezone.now()
+                with transaction.atomic():
+                    objects = build(batch)
+                    model.objects.bulk_create(
+                        objects, ignore_conflicts=model is Follow)
+                self.created += len(objects)
+                if objects and not options['skip_derived']:
+                    # Производные данные обновляются по каждой пачке,
+                    # поэтому память не зависит от размера файла
+                    scopes = refresh(objects, batch_started)
+                    bump_generations(*scopes)
+                    pagecache.purge_all()
+                if time.monotonic() - reported >= options['progress_every']:
+                    reported = time.monotonic()
+                    self.report(self.stderr, started)
+        self.report(self.stdout, started)
+        for reason, count in self.skipped.most_common():
+            self.stdout.write(f'  пропущено ({reason}): {count}')
+
+    # bulk_create не отправляет сигналы. refresh_* обновляют счётчики,
+    # ленты и поиск только для объектов пачки и возвращают области кэша,
+    # которые нужно сбросить; остальной сайт при этом не затрагивается.
+    def refresh_posts(self, posts, since):
+        author_ids = {post.author_id for post in posts}
+        followers = defaultdict(list)
+        for author_id, user_id in Follow.objects.filter(
+                author_id__in=author_ids).values_list('author_id', 'user_id'):
+            followers[author_id].append(user_id)
+        # Без явного id bulk_create в SQLite не возвращает pk, поэтому
+        # посты пачки находятся по времени изменения
+        created = Post.objects.filter(
+            author_id__in=author_ids, updated__gte=since
+        ).select_related('author', 'group')
+        scopes = set()
+        entries = []
+        for post in created.iterator():
+            search.index_post(post)
+            scopes.update(post_scopes(post.author_id, post.group_id))
+            entries.extend(
+                TimelineEntry(user_id=user_id, post_id=post.pk,
+                              author_id=post.author_id,
+                              pub_date=post.pub_date)
+                for user_id in followers[post.author_id])
+        TimelineEntry.objects.bulk_create(
+            entries, batch_size=500, ignore_conflicts=True)
+        for user_id in {user_id for users in followers.values()
+                        for user_id in users}:
+            trim_timeline(user_id)
+        for author in User.objects.filter(pk__in=author_ids):
+            search.index_author(author)
+            recount_user(author.pk)
+            scopes.add(author_scope(author.pk))
+        return scopes
+
+    def refresh_comments(self, comments, since):
+        post_ids = {comment.post_id for comment in comments}
+        recount_comments(post_ids)
+        scopes = {post_scope(post_id) for post_id in post_ids}
+        for author_id, group_id in Post.objects.filter(
+                pk__in=post_ids).values_list('author_id', 'group_id'):
+            scopes.update(post_scopes(author_id, group_id))
+        return scopes
+
+    def refresh_follows(self, follows, since):
+        for follow in follows:
+            backfill_timeline(User(pk=follow.user_id),
+                              User(pk=follow.author_id))
+        forget_followed(*{follow.user_id for follow in follows})
+        user_ids = {follow.user_id for follow in follows}
+        user_ids.update(follow.author_id for follow in follows)
+        for user_id in user_ids:
+            recount_user(user_id)
+        return {author_scope(user_id) for user_id in user_ids}
+
+    def report(self, stream, started):
+        elapsed = max(time.monotonic() - started, 1e-6)
+        stream.write(
+            'Прочитано {}, создано {}, пропущено {} за {:.1f} с '
+            '({:.0f} строк/с)'.format(
+                self.read, self.created, sum(self.skipped.values()),
+                elapsed, self.read / elapsed))
+
+    @contextmanager
+    def open(self, path):
+        if path == '-':
+            yield io.TextIOWrapper(sys.stdin.buffer, encoding='utf-8')
+            return
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден')
+        with open(path, encoding='utf-8', newline='') as source:
+            yield source
+
+    def read_jsonl(self, source):
+        for line in source:
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            if not isinstance(row, dict):
+                self.read += 1
+                self.skipped['неверный JSON'] += 1
+                continue
+            yield row
+
+    def read_csv(self, source):
+        yield from csv.DictReader(source)
+
+    def rows(self, batch, build_one):
+        """Применяет build_one к строкам пачки, пропуская ошибочные."""
+        objects = []
+        for row in batch:
+            try:
+                objects.append(build_one(row))
+            except SkipRow as reason:
+                self.skipped[str(reason)] += 1
+        return objects
+
+    def resolve_users(self, usernames):
+        found = self.users.resolve(usernames)
+        missing = set(filter(None, usernames)) - set(found)
+        if missing and self.create_users:
+            password = make_password(None)
+            User.objects.bulk_create(
+                [User(username=username, password=password)
+                 for username in sorted(missing)],
+                ignore_conflicts=True)
+            found = self.users.resolve(usernames)
+        return found
+
+    def build_posts(self, batch):
+        authors = self.resolve_users([row.get('author') for row in batch])
+        groups = self.groups.resolve([row.get('group') for row in batch])
+        # Архив хранит исходные id постов: занять их нельзя, иначе пост
+        # и архивная запись разойдутся на одном id
+        ids = set()
+        for row in batch:
+            try:
+                ids.add(int(row.get('id')))
+            except (TypeError, ValueError):
+                pass
+        archived, taken = set(), set()
+        for chunk in chunked(ids, 500):
+            archived.update(ArchivedPost.all_objects.filter(
+                pk__in=chunk).values_list('pk', flat=True))
+            taken.update(Post.all_objects.filter(
+                pk__in=chunk).values_list('pk', flat=True))
+
+        def build(row):
+            author = required(row, 'author')
+            if author not in authors:
+                raise SkipRow('неизвестный автор')
+            group = row.get('group') or None
+            if group and group not in groups:
+                raise SkipRow('неизвестная группа')
+            pk = row.get('id') or None
+            if pk is not None:
+                try:
+                    pk = int(pk)
+                except (TypeError, ValueError):
+                    raise SkipRow('неверный id')
+                if pk in archived:
+                    raise SkipRow('id занят архивным постом')
+                if pk in taken:
+                    raise SkipRow('id уже занят')
+                taken.add(pk)
+            return Post(
+                pk=pk,
+                text=required(row, 'text'),
+                author_id=authors[author],
+                group_id=groups.get(group),
+                image=row.get('image') or '',
+                pub_date=parse_date(row.get('pub_date')),
+            )
+
+        return self.rows(batch, build)
+
+    def build_comments(self, batch):
+        authors = self.resolve_users([row.get('author') for row in batch])
+        post_ids = set()
+        for row in batch:
+            try:
+                post_ids.add(int(row.get('post')))
+            except (TypeError, ValueError):
+                pass
+        existing = set()
+        for chunk in chunked(post_ids, 500):
+            existing.update(Post.objects.filter(pk__in=chunk).values_list(
+                'pk', flat=True))
+
+        def build(row):
+            try:
+                post_id = int(required(row, 'post'))
+            except ValueError:
+                raise SkipRow('неизвестный пост')
+            if post_id not in existing:
+                raise SkipRow('неизвестный пост')
+            author = required(row, 'author')
+            if author not in authors:
+                raise SkipRow('неизвестный автор')
+            return Comment(
+                post_id=post_id,
+                author_id=authors[author],
+                text=required(row, 'text'),
+                created=parse_date(row.get('created')),
+            )
+
+        return self.rows(batch, build)
+
+    def build_follows(self, batch):
+        users = self.resolve_users(
+            [row.get(field) for row in batch for field in ('user', 'author')])
+        # ignore_conflicts молча пропускает повторы, поэтому они
+        # отсеиваются заранее, чтобы счётчик созданных не врал
+        user_ids = set(users.values())
+        existing = set()
+        for chunk in chunked(user_ids, 500):
+            existing.update(
+                pair for pair in Follow.objects.filter(
+                    user_id__in=chunk).values_list('user_id', 'author_id')
+                if pair[1] in user_ids)
+
+        def build(row):
+            user, author = required(row, 'user'), required(row, 'author')
+            if user not in users or author not in users:
+                raise SkipRow('неизвестный пользователь')
+            if user == author:
+                raise SkipRow('подписка на себя')
+            pair = users[user], users[author]
+            if pair in existing:
+                raise SkipRow('подписка уже есть')
+            existing.add(pair)
+            return Follow(user_id=pair[0], author_id=pair[1])
+
+        return self.rows(batch, build)
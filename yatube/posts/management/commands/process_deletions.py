@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.deletion import delete_later, run_deletion
+from posts.models import Deletion, Group, Post, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Ставит посты, группы и пользователей в очередь на удаление и '
+        'доводит до конца все незавершённые удаления'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--post', type=int, action='append', default=[],
+            help='id поста, который нужно удалить'
+        )
+        parser.add_argument(
+            '--group', action='append', default=[],
+            help='slug группы, которую нужно удалить'
+        )
+        parser.add_argument(
+            '--user', action='append', default=[],
+            help='Имя пользователя, которого нужно удалить'
+        )
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Сколько строк удалять в одной транзакции'
+        )
+
+    def handle(self, *args, **options):
+        targets = []
+        for model, field, values in (
+                (Post, 'pk', options['post']),
+                (Group, 'slug', options['group']),
+                (User, 'username', options['user'])):
+            for value in values:
+                obj = model.objects.filter(**{field: value}).first()
+                if obj is None:
+                    raise CommandError(
+                        f'Не найдено: {model._meta.verbose_name} {value}')
+                targets.append(obj)
+        for obj in targets:
+            # Удаление выполнит эта же команда ниже, не фоновый поток
+            delete_later(obj, background=False)
+        pending = Deletion.objects.filter(
+            finished__isnull=True).order_by('pk')
+        for deletion in pending:
+            self.stdout.write(f'Удаление: {deletion}')
+            run_deletion(
+                deletion.pk, options['batch_size'], progress=self.progress)
+        self.stdout.write(f'Завершено удалений: {len(pending)}')
+
+    def progress(self, deletion):
+        self.stderr.write(
+            f'  {deletion.step}: удалено строк {deletion.removed}')
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import recount_all
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает и чинит денормализованные счётчики'
+
+    def handle(self, *args, **options):
+        recount_all()
+        self.stdout.write('Счётчики пересчитаны')
@@ -0,0 +1,168 @@
+import random
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from PIL import Image
+
+from posts.bulk import keep_dates, rebuild_derived
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+WORDS = (
+    'город море горы лес река дорога путешествие утро вечер друзья кофе '
+    'книга музыка фильм работа отпуск снег солнце дождь поезд самолёт '
+    'прогулка фотография кошка собака весна лето осень зима праздник'
+).split()
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими данными заданного объёма'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=1000)
+        parser.add_argument('--comments', type=int, default=3000)
+        parser.add_argument('--follows', type=int, default=1000)
+        parser.add_argument(
+            '--images', type=int, default=20,
+            help='Сколько разных картинок создать для постов'
+        )
+        parser.add_argument(
+            '--image-ratio', type=float, default=0.2,
+            help='Доля постов с картинкой'
+        )
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--batch-size', type=int, default=None,
+            help='Размер пачки bulk_create (по умолчанию выбирает Django)'
+        )
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересчитывать счётчики, ленты и поисковый индекс'
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        # Даты отсчитываются от начала суток, чтобы повторный запуск
+        # с тем же seed давал те же данные.
+        self.now = timezone.now().replace(
+            hour=0, minute=0, second=0, microsecond=0)
+        self.days = options['days']
+        prefix = 'seed{}_'.format(options['seed'])
+        with transaction.atomic(), keep_dates(
+                Post._meta.get_field('pub_date'),
+                Comment._meta.get_field('created')):
+            users = self.create_users(prefix, options['users'])
+            groups = self.create_groups(prefix, options['groups'])
+            images = self.create_images(prefix, options['images'])
+            posts = self.create_posts(
+                options['posts'], users, groups, images,
+                options['image_ratio'])
+            self.create_comments(options['comments'], users, posts)
+            self.create_follows(options['follows'], users)
+        if not options['skip_derived']:
+            rebuild_derived(
+                User.objects.filter(username__startswith=f'{prefix}user'))
+        self.stdout.write(
+            'Создано: пользователей {}, групп {}, постов {}'.format(
+                len(users), len(groups), len(posts)))
+
+    def text(self, words):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words))
+
+    def random_date(self):
+        return self.now - timedelta(
+            seconds=self.random.randrange(self.days * 24 * 60 * 60))
+
+    def created_ids(self, model, objects, **lookup):
+        model.objects.bulk_create(objects, batch_size=self.batch_size)
+        return list(
+            model.objects.filter(**lookup).order_by('pk')
+            .values_list('pk', flat=True)
+        )
+
+    def create_users(self, prefix, count):
+        password = make_password(None)
+        users = [
+            User(username=f'{prefix}user{number}', password=password,
+                 first_name=self.random.choice(WORDS).title())
+            for number in range(count)
+        ]
+        return self.created_ids(
+            User, users, username__startswith=f'{prefix}user')
+
+    def create_groups(self, prefix, count):
+        groups = [
+            Group(title=self.text(2).title(), slug=f'{prefix}group{number}',
+                  description=self.text(12))
+            for number in range(count)
+        ]
+        return self.created_ids(
+            Group, groups, slug__startswith=f'{prefix}group')
+
+    def create_images(self, prefix, count):
+        names = []
+        for number in range(count):
+            color = tuple(self.random.randrange(256) for _ in range(3))
+            output = BytesIO()
+            Image.new('RGB', (1280, 720), color).save(output, 'JPEG')
+            names.append(default_storage.save(
+                f'posts/{prefix}{number}.jpg', ContentFile(output.getvalue())))
+        return names
+
+    def create_posts(self, count, users, groups, images, image_ratio):
+        first_id = (Post.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0) + 1
+        posts = []
+        for _ in range(count):
+            with_image = images and self.random.random() < image_ratio
+            posts.append(Post(
+                text=self.text(self.random.randint(5, 60)),
+                author_id=self.random.choice(users),
+                group_id=(self.random.choice(groups)
+                          if groups and self.random.random() < 0.7 else None),
+                image=self.random.choice(images) if with_image else '',
+                pub_date=self.random_date(),
+            ))
+        return self.created_ids(Post, posts, pk__gte=first_id)
+
+    def create_comments(self, count, users, posts):
+        if not posts:
+            return
+        comments = [
+            Comment(
+                post_id=self.random.choice(posts),
+                author_id=self.random.choice(users),
+                text=self.text(self.random.randint(2, 20)),
+                created=self.random_date(),
+            )
+            for _ in range(count)
+        ]
+        Comment.objects.bulk_create(comments, batch_size=self.batch_size)
+
+    def create_follows(self, count, users):
+        if len(users) < 2:
+            return
+        pairs = set()
+        attempts = 0
+        while len(pairs) < count and attempts < count * 10:
+            attempts += 1
+            user, author = self.random.sample(users, 2)
+            pairs.add((user, author))
+        Follow.objects.bulk_create(
+            [Follow(user_id=user, author_id=author)
+             for user, author in sorted(pairs)],
+            batch_size=self.batch_size,
+            ignore_conflicts=True
+        )
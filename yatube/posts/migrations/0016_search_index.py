@@ -0,0 +1,34 @@
+# Generated by Django 2.2.19 on 2026-10-18 21:02
+
+from django.db import migrations
+
+from posts import search
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS posts_search USING fts5('
+        "kind UNINDEXED, title, body, "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    # Индекс заполняется сразу, иначе поиск не найдёт уже созданное
+    search.rebuild(apps)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_comment_post_created_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -1,10 +1,17 @@
-from core.models import CreatedModel
+from core.models import CreatedModel, UpdatedModel, UpdatedQuerySet
 from django.contrib.auth import get_user_model
 from django.db import models
 
 User = get_user_model()
 
 
+class LiveManager(models.Manager):
+    """Не показывает объекты, ожидающие удаления (см. posts.deletion)."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
+
+
 class Group(models.Model):
     title = models.CharField(
         max_length=200,
@@ -17,6 +24,14 @@ class Group(models.Model):
     description = models.TextField(
         verbose_name='Описание'
     )
+    is_deleted = models.BooleanField(
+        'Удаляется',
+        default=False,
+        editable=False
+    )
+
+    objects = LiveManager()
+    all_objects = models.Manager()
 
     class Meta:
         verbose_name = 'Группа'
@@ -26,7 +41,7 @@ class Group(models.Model):
         return self.title
 
 
-class Post(CreatedModel):
+class Post(CreatedModel, UpdatedModel):
     text = models.TextField(
         verbose_name='Текст',
         help_text='Введите описание поста'
@@ -50,9 +65,33 @@ class Post(CreatedModel):
         upload_to='posts/',
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False
+    )
+    is_deleted = models.BooleanField(
+        'Удаляется',
+        default=False,
+        editable=False
+    )
+
+    objects = LiveManager.from_queryset(UpdatedQuerySet)()
+    all_objects = UpdatedQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(fields=['-pub_date', '-id'], name='post_feed_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_feed_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_feed_idx'
+            ),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
@@ -60,7 +99,94 @@ class Post(CreatedModel):
         return self.text[:15]
 
 
-class Comment(models.Model):
+class ArchivedPost(models.Model):
+    """Старый пост, перенесённый из Post командой archive_posts.
+
+    id совпадает с id исходного поста, поэтому ссылки на пост и записи
+    поискового индекса остаются верными.
+    """
+    id = models.IntegerField(primary_key=True)
+    text = models.TextField(verbose_name='Текст')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_posts',
+        verbose_name='Автор'
+    )
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.SET_NULL,
+        related_name='archived_posts',
+        blank=True, null=True,
+        verbose_name='Группа'
+    )
+    image = models.ImageField('Картинка', upload_to='posts/', blank=True)
+    pub_date = models.DateTimeField('Дата создания')
+    updated = models.DateTimeField('Дата изменения')
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев', default=0)
+    is_deleted = models.BooleanField(
+        'Удаляется',
+        default=False,
+        editable=False
+    )
+
+    objects = LiveManager.from_queryset(UpdatedQuerySet)()
+    all_objects = UpdatedQuerySet.as_manager()
+
+    class Meta:
+        ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='archived_feed_idx'),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='archived_author_feed_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='archived_group_feed_idx'
+            ),
+        ]
+        verbose_name = 'Архивный пост'
+        verbose_name_plural = 'Архивные посты'
+
+    def __str__(self):
+        return self.text[:15]
+
+
+class ArchivedComment(models.Model):
+    """Комментарий к архивному посту, id совпадает с исходным."""
+    id = models.IntegerField(primary_key=True)
+    post = models.ForeignKey(
+        ArchivedPost,
+        related_name='comments',
+        on_delete=models.CASCADE
+    )
+    author = models.ForeignKey(
+        User,
+        related_name='archived_comments',
+        on_delete=models.CASCADE
+    )
+    text = models.TextField(verbose_name='Текст комментария')
+    created = models.DateTimeField('Дата комментария')
+    updated = models.DateTimeField('Дата изменения')
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='archived_comment_post_idx'
+            ),
+        ]
+        verbose_name = 'Архивный комментарий'
+        verbose_name_plural = 'Архивные комментарии'
+
+    def __str__(self):
+        return self.text[:15]
+
+
+class Comment(UpdatedModel):
     post = models.ForeignKey(
         Post,
         related_name='comments',
@@ -81,6 +207,12 @@ class Comment(models.Model):
     )
 
     class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx'
+            ),
+        ]
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
 
@@ -107,3 +239,89 @@ class Follow(models.Model):
                 name='unique_following'
             )
         ]
+
+
+class TimelineEntry(models.Model):
+    """Материализованная лента подписок: пост автора у подписчика."""
+    user = models.ForeignKey(
+        User,
+        related_name='timeline',
+        on_delete=models.CASCADE
+    )
+    post = models.ForeignKey(
+        Post,
+        related_name='timeline_entries',
+        on_delete=models.CASCADE
+    )
+    author = models.ForeignKey(
+        User,
+        related_name='+',
+        on_delete=models.CASCADE
+    )
+    pub_date = models.DateTimeField('Дата создания поста')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-id'],
+                name='timeline_user_feed_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='timeline_user_author_idx'
+            ),
+        ]
+
+
+class UserCounters(models.Model):
+    """Денормализованные счётчики пользователя, обновляются сигналами."""
+    user = models.OneToOneField(
+        User,
+        related_name='counters',
+        on_delete=models.CASCADE,
+        primary_key=True
+    )
+    posts_count = models.PositiveIntegerField('Постов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
+    following_count = models.PositiveIntegerField('Подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики пользователя'
+        verbose_name_plural = 'Счётчики пользователей'
+
+    def __str__(self):
+        return str(self.user)
+
+
+class Deletion(models.Model):
+    """Фоновое удаление поста, группы или пользователя."""
+    POST = 'post'
+    GROUP = 'group'
+    USER = 'user'
+    KINDS = (
+        (POST, 'Пост'),
+        (GROUP, 'Группа'),
+        (USER, 'Пользователь'),
+    )
+
+    kind = models.CharField('Что удаляется', max_length=10, choices=KINDS)
+    object_id = models.PositiveIntegerField('id объекта')
+    created = models.DateTimeField('Дата постановки', auto_now_add=True)
+    finished = models.DateTimeField('Дата завершения', null=True, blank=True)
+    step = models.CharField('Текущий шаг', max_length=50, blank=True)
+    removed = models.PositiveIntegerField('Удалено строк', default=0)
+
+    class Meta:
+        verbose_name = 'Удаление'
+        verbose_name_plural = 'Удаления'
+
+    def __str__(self):
+        return f'{self.get_kind_display()} {self.object_id}'
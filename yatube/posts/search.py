@@ -0,0 +1,228 @@
+"""Полнотекстовый поиск по постам, группам и авторам на SQLite FTS5.
+
+Все объекты лежат в одной таблице posts_search. rowid кодирует тип
+объекта и его id, поэтому запись обновляется и удаляется по первичному
+ключу. В индекс и в запрос попадают основы слов (см. posts.stemmer).
+"""
+import re
+
+from django.apps import apps as global_apps
+from django.conf import settings
+from django.db import connection
+
+from .models import ArchivedPost, Group, Post, User
+from .stemmer import stem
+
+TABLE = 'posts_search'
+
+POST = 0
+GROUP = 1
+AUTHOR = 2
+KINDS = 4
+
+WORD = re.compile(r'\w+')
+
+
+def is_available():
+    return connection.vendor == 'sqlite'
+
+
+def normalize(text):
+    """Текст в виде основ слов через пробел."""
+    return ' '.join(stem(word) for word in WORD.findall(text or ''))
+
+
+def build_query(text):
+    """Строка MATCH для FTS5: все слова запроса как префиксы основ."""
+    return ' '.join(f'"{word}"*' for word in normalize(text).split())
+
+
+def _rowid(kind, object_id):
+    return object_id * KINDS + kind
+
+
+def _author_name(user):
+    # Без get_full_name: в миграциях у исторической модели нет методов
+    return ' '.join(filter(None, (
+        user.username, user.first_name, user.last_name)))
+
+
+def _write(kind, object_id, title, body):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT OR REPLACE INTO {TABLE} (rowid, kind, title, body) '
+            'VALUES (%s, %s, %s, %s)',
+            [_rowid(kind, object_id), kind, normalize(title), normalize(body)]
+        )
+
+
+def _remove(kind, object_id):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid = %s',
+            [_rowid(kind, object_id)]
+        )
+
+
+def index_post(post):
+    if not is_available():
+        return
+    group_title = post.group.title if post.group_id else ''
+    _write(POST, post.pk, f'{_author_name(post.author)} {group_title}',
+           post.text)
+
+
+def remove_post(post_id):
+    if is_available():
+        _remove(POST, post_id)
+
+
+def remove_posts(post_ids):
+    if not is_available() or not post_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(post_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE rowid IN ({placeholders})',
+            [_rowid(POST, post_id) for post_id in post_ids]
+        )
+
+
+def index_group(group):
+    if is_available():
+        _write(GROUP, group.pk, group.title, group.description)
+
+
+def remove_group(group_id):
+    if is_available():
+        _remove(GROUP, group_id)
+
+
+def index_author(user):
+    if is_available():
+        _write(AUTHOR, user.pk, _author_name(user), '')
+
+
+def remove_author(user_id):
+    if is_available():
+        _remove(AUTHOR, user_id)
+
+
+def reindex_group_posts(group_id):
+    posts = Post.objects.filter(group_id=group_id).select_related(
+        'author', 'group')
+    for post in posts.iterator():
+        index_post(post)
+
+
+def reindex_author_posts(user_id):
+    posts = Post.objects.filter(author_id=user_id).select_related(
+        'author', 'group')
+    for post in posts.iterator():
+        index_post(post)
+
+
+def rebuild(apps=global_apps):
+    """Полностью пересобирает индекс.
+
+    Миграции передают в apps свой реестр исторических моделей.
+    """
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {TABLE}')
+    for group in apps.get_model('posts', 'Group').objects.iterator():
+        index_group(group)
+    authors = apps.get_model(settings.AUTH_USER_MODEL).objects.filter(
+        posts__isnull=False).distinct()
+    for user in authors.iterator():
+        index_author(user)
+    post_models = [apps.get_model('posts', 'Post')]
+    try:
+        post_models.append(apps.get_model('posts', 'ArchivedPost'))
+    except LookupError:
+        # Архив появляется в более поздней миграции
+        pass
+    for model in post_models:
+        posts = model.objects.select_related('author', 'group')
+        for post in posts.iterator():
+            index_post(post)
+
+
+def match_sql(kind):
+    """SQL, выбирающий id объектов типа kind по запросу, для pk__in."""
+    return (
+        f'SELECT rowid / {KINDS} FROM {TABLE} '
+        f'WHERE {TABLE} MATCH %s AND kind = {kind}'
+    )
+
+
+def _ranked_ids(kind, query, limit, offset=0):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT rowid / {KINDS} FROM {TABLE} '
+            f'WHERE {TABLE} MATCH %s AND kind = %s '
+            f'ORDER BY bm25({TABLE}, 0, 2.0, 1.0) LIMIT %s OFFSET %s',
+            [query, kind, limit, offset]
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _in_order(queryset, ids):
+    objects = queryset.in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
+
+
+class PostResults:
+    """Найденные посты по убыванию релевантности.
+
+    Последовательность для django.core.paginator.Paginator: count()
+    считается по индексу, а срез выбирает одну страницу id через
+    LIMIT/OFFSET и догружает посты одним запросом (и вторым для
+    перенесённых в архив).
+    """
+
+    def __init__(self, text):
+        self.query = build_query(text)
+
+    def count(self):
+        if not self.query or not is_available():
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT count(*) FROM {TABLE} '
+                f'WHERE {TABLE} MATCH %s AND kind = %s',
+                [self.query, POST]
+            )
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if not self.query or not is_available():
+            return []
+        start = index.start or 0
+        ids = _ranked_ids(POST, self.query, index.stop - start, start)
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        archived = [pk for pk in ids if pk not in posts]
+        if archived:
+            posts.update(ArchivedPost.objects.select_related(
+                'author', 'group').in_bulk(archived))
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+def search_groups(text, limit=5):
+    query = build_query(text)
+    if not query or not is_available():
+        return []
+    return _in_order(Group.objects.all(), _ranked_ids(GROUP, query, limit))
+
+
+def search_authors(text, limit=5):
+    query = build_query(text)
+    if not query or not is_available():
+        return []
+    return _in_order(User.objects.all(), _ranked_ids(AUTHOR, query, limit))
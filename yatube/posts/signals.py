@@ -0,0 +1,169 @@
+from core import pagecache
+from core.tasks import defer, defer_cpu
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.urls import reverse
+
+from . import search
+from .caching import (FEED_SCOPE, author_scope, bump_generations,
+                      group_scope, post_scope, post_scopes, purge_post_pages)
+from .counters import bump_post_comments, bump_user
+from .follows import forget_followed
+from .models import Comment, Follow, Group, Post, User
+from .thumbnails import generate_post_thumbnails
+from .timeline import fan_out_post
+
+AUTHOR_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        bump_user(instance.author_id, 'posts_count', 1)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_created_post(sender, instance, created, **kwargs):
+    # Пост из формы, админки, shell и команд одинаково попадает в ленты
+    # подписчиков; раскладка идёт после коммита
+    if created:
+        defer(fan_out_post, instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    # Скрытый пост вычел себя из счётчика ещё в delete_later
+    if not instance.is_deleted:
+        bump_user(instance.author_id, 'posts_count', -1)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, **kwargs):
+    if created:
+        bump_post_comments(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    bump_post_comments(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        bump_user(instance.author_id, 'followers_count', 1)
+        bump_user(instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    bump_user(instance.author_id, 'followers_count', -1)
+    bump_user(instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def forget_followed_authors(sender, instance, **kwargs):
+    forget_followed(instance.user_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_old_group(sender, instance, **kwargs):
+    instance._old_group_id = None
+    if instance.pk:
+        instance._old_group_id = (
+            Post.objects
+            .filter(pk=instance.pk)
+            .values_list('group_id', flat=True)
+            .first()
+        )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    group_ids = (instance.group_id, getattr(instance, '_old_group_id', None))
+    bump_generations(
+        post_scope(instance.pk), *post_scopes(instance.author_id, *group_ids))
+    purge_post_pages(instance.pk, instance.author_id, *group_ids)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comment_feeds(sender, instance, **kwargs):
+    post = (
+        Post.objects
+        .filter(pk=instance.post_id)
+        .values('author_id', 'group_id')
+        .first()
+    )
+    if post is not None:
+        bump_generations(
+            post_scope(instance.post_id),
+            *post_scopes(post['author_id'], post['group_id']))
+        purge_post_pages(
+            instance.post_id, post['author_id'], post['group_id'])
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def invalidate_author_pages(sender, instance, **kwargs):
+    # Кнопка подписки и счётчики подписок есть в шапках обоих профилей
+    bump_generations(
+        author_scope(instance.author_id), author_scope(instance.user_id))
+    usernames = User.objects.filter(
+        pk__in=(instance.author_id, instance.user_id)
+    ).values_list('username', flat=True)
+    pagecache.purge(*(
+        reverse('posts:profile', kwargs={'username': username})
+        for username in usernames))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    bump_generations(FEED_SCOPE, group_scope(instance.pk))
+    # Название группы есть на страницах всех её постов
+    pagecache.purge_all()
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, created, **kwargs):
+    search.index_post(instance)
+    if created:
+        search.index_author(instance.author)
+
+
+@receiver(post_save, sender=User)
+def index_author(sender, instance, created, update_fields, **kwargs):
+    # Имя автора есть и в его записи, и в записях всех его постов
+    if created or not instance.is_active:
+        return
+    if update_fields and not AUTHOR_FIELDS.intersection(update_fields):
+        return
+    if instance.posts.exists():
+        search.index_author(instance)
+        defer(search.reindex_author_posts, instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Group)
+def index_group(sender, instance, created, **kwargs):
+    search.index_group(instance)
+    if not created:
+        defer(search.reindex_group_posts, instance.pk)
+
+
+@receiver(post_delete, sender=Group)
+def unindex_group(sender, instance, **kwargs):
+    search.remove_group(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def pregenerate_thumbnails(sender, instance, **kwargs):
+    if instance.image:
+        defer_cpu(generate_post_thumbnails, [instance.pk])
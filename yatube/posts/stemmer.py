@@ -0,0 +1,127 @@
+"""Стеммер Snowball для русского языка.
+
+Перенос алгоритма https://snowballstem.org/algorithms/russian/stemmer.html
+без внешних зависимостей. Нужен поиску: FTS5 умеет только английский
+porter, поэтому слова приводятся к основе до записи в индекс и в запросе.
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+
+def _endings(after_a_or_ya=(), plain=()):
+    """Окончания по убыванию длины с признаком «только после а/я»."""
+    endings = [(ending, True) for ending in after_a_or_ya]
+    endings += [(ending, False) for ending in plain]
+    return sorted(endings, key=lambda item: len(item[0]), reverse=True)
+
+
+PERFECTIVE_GERUND = _endings(
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = _endings(plain=(
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+))
+PARTICIPLE = _endings(
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = _endings(plain=('ся', 'сь'))
+VERB = _endings(
+    ('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но', 'ет',
+     'ют', 'ны', 'ть', 'ешь', 'нно'),
+    ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей', 'уй',
+     'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят', 'ует', 'уют',
+     'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'),
+)
+NOUN = _endings(plain=(
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии', 'и',
+    'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам', 'ом', 'о',
+    'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия', 'ья', 'я',
+))
+SUPERLATIVE = _endings(plain=('ейше', 'ейш'))
+DERIVATIONAL = _endings(plain=('ост', 'ость'))
+
+CYRILLIC = re.compile('[а-я]')
+
+
+def _strip(word, endings):
+    """Отрезает самое длинное подходящее окончание или возвращает None.
+
+    Как и в Snowball, если самое длинное окончание требует перед собой
+    «а» или «я», а их нет, более короткие окончания не пробуются.
+    """
+    for ending, after_a_or_ya in endings:
+        if word.endswith(ending):
+            stem = word[:-len(ending)]
+            if after_a_or_ya and not stem.endswith(('а', 'я')):
+                return None
+            return stem
+    return None
+
+
+def _regions(word):
+    """Начала областей RV и R2."""
+    rv = r1 = r2 = len(word)
+    for index, char in enumerate(word):
+        if char in VOWELS:
+            rv = index + 1
+            break
+    for index in range(1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            r1 = index + 1
+            break
+    for index in range(r1 + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            r2 = index + 1
+            break
+    return rv, r2
+
+
+def stem(word):
+    """Основа русского слова; остальные слова возвращаются как есть."""
+    word = word.lower().replace('ё', 'е')
+    if not CYRILLIC.search(word):
+        return word
+    rv_start, r2_start = _regions(word)
+    prefix, rv = word[:rv_start], word[rv_start:]
+
+    stemmed = _strip(rv, PERFECTIVE_GERUND)
+    if stemmed is None:
+        unreflexive = _strip(rv, REFLEXIVE)
+        if unreflexive is not None:
+            rv = unreflexive
+        stemmed = _strip(rv, ADJECTIVE)
+        if stemmed is not None:
+            participle = _strip(stemmed, PARTICIPLE)
+            if participle is not None:
+                stemmed = participle
+        else:
+            stemmed = _strip(rv, VERB)
+            if stemmed is None:
+                stemmed = _strip(rv, NOUN)
+    if stemmed is not None:
+        rv = stemmed
+
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    derivational = _strip(rv, DERIVATIONAL)
+    if derivational is not None and (
+            rv_start + len(derivational) >= r2_start):
+        rv = derivational
+
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    else:
+        superlative = _strip(rv, SUPERLATIVE)
+        if superlative is not None:
+            rv = superlative
+            if rv.endswith('нн'):
+                rv = rv[:-1]
+        elif rv.endswith('ь'):
+            rv = rv[:-1]
+    return prefix + rv
@@ -0,0 +1,46 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core import metrics
+
+from ..caching import get_cards, set_cards
+
+register = template.Library()
+
+CARD_TEMPLATE = 'posts/includes/post_list.html'
+
+
+def _load_cards(context, posts):
+    cards = get_cards(posts)
+    missing = [post for post in posts if post.pk not in cards]
+    labels = {'view': metrics.current_view()}
+    metrics.registry.inc(
+        'yatube_post_card_cache_hits_total', labels, len(cards))
+    metrics.registry.inc(
+        'yatube_post_card_cache_misses_total', labels, len(missing))
+    if missing:
+        card_template = context.template.engine.get_template(CARD_TEMPLATE)
+        rendered = [
+            (post, card_template.render(template.Context(
+                {'post': post}, autoescape=context.autoescape)))
+            for post in missing
+        ]
+        set_cards(rendered)
+        cards.update((post.pk, html) for post, html in rendered)
+    return cards
+
+
+@register.simple_tag(takes_context=True)
+def post_card(context, post, page):
+    """Карточка поста, общая для всех лент.
+
+    При первом вызове на странице карточки всех постов page достаются
+    из кэша одним запросом, рендерятся только недостающие.
+    """
+    key = ('post_cards', id(page))
+    cards = context.render_context.get(key)
+    if cards is None:
+        cards = context.render_context[key] = _load_cards(context, list(page))
+    if post.pk not in cards:
+        cards.update(_load_cards(context, [post]))
+    return mark_safe(cards[post.pk])
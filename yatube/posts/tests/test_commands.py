@@ -0,0 +1,195 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from posts import search
+from posts.models import (ArchivedPost, Comment, Follow, Group, Post,
+                          TimelineEntry, User)
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class SeedDataCommandTest(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_seed_data_creates_requested_volume(self):
+        call_command(
+            'seed_data', users=5, groups=2, posts=40, comments=30,
+            follows=8, images=2, image_ratio=0.5, seed=7, stdout=StringIO())
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(Group.objects.count(), 2)
+        self.assertEqual(Post.objects.count(), 40)
+        self.assertEqual(Comment.objects.count(), 30)
+        self.assertEqual(Follow.objects.count(), 8)
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        self.assertEqual(
+            Post.objects.values('pub_date').distinct().count(), 40)
+        self.assertTrue(TimelineEntry.objects.exists())
+        author = Post.objects.first().author
+        self.assertEqual(
+            author.counters.posts_count, author.posts.count())
+
+
+class ImportDataCommandTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        User.objects.create_user(username='reader')
+        Group.objects.create(title='Горы', slug='mountains')
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_import_data_loads_posts_comments_and_follows(self):
+        posts = self.write('posts.jsonl', '\n'.join([
+            json.dumps({'id': 100, 'author': 'writer', 'text': 'Первый',
+                        'group': 'mountains',
+                        'pub_date': '2020-01-02T10:00:00'}),
+            json.dumps({'id': 101, 'author': 'writer', 'text': 'Второй'}),
+            json.dumps({'author': 'writer', 'text': 'Чужая группа',
+                        'group': 'unknown'}),
+            '{сломанная строка',
+        ]))
+        comments = self.write(
+            'comments.csv',
+            'post,author,text,created\n'
+            '100,reader,Отлично,2020-01-03T10:00:00\n'
+            '999,reader,Нет поста,\n'
+        )
+        follows = self.write('follows.jsonl', '\n'.join([
+            json.dumps({'user': 'reader', 'author': 'writer'}),
+            json.dumps({'user': 'reader', 'author': 'writer'}),
+            json.dumps({'user': 'reader', 'author': 'reader'}),
+        ]))
+        output = StringIO()
+        call_command('import_data', posts, kind='posts', create_users=True,
+                     batch_size=2, stdout=output, stderr=StringIO())
+        call_command('import_data', comments, kind='comments',
+                     stdout=output, stderr=StringIO())
+        call_command('import_data', follows, kind='follows',
+                     stdout=output, stderr=StringIO())
+        writer = User.objects.get(username='writer')
+        self.assertEqual(
+            list(writer.posts.order_by('pk').values_list('pk', flat=True)),
+            [100, 101])
+        post = Post.objects.get(pk=100)
+        self.assertEqual(post.group.slug, 'mountains')
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(Comment.objects.get().created.day, 3)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(writer.counters.followers_count, 1)
+        self.assertEqual(TimelineEntry.objects.count(), 2)
+        self.assertIn('пропущено (неизвестная группа): 1',
+                      output.getvalue())
+        self.assertIn('пропущено (неверный JSON): 1', output.getvalue())
+
+    def test_import_data_refreshes_only_touched_objects(self):
+        reader = User.objects.get(username='reader')
+        writer = User.objects.create_user(username='writer')
+        Follow.objects.create(user=reader, author=writer)
+        Post.objects.create(author=reader, text='Старый пост')
+        cache.set('unrelated', 'value')
+        posts = self.write('posts.jsonl', json.dumps(
+            {'author': 'writer', 'text': 'Новый пост'}))
+        follows = self.write('follows.jsonl', '\n'.join([
+            json.dumps({'user': 'reader', 'author': 'writer'}),
+            json.dumps({'user': 'writer', 'author': 'reader'}),
+            json.dumps({'user': 'writer', 'author': 'reader'}),
+        ]))
+        output = StringIO()
+        call_command('import_data', posts, kind='posts',
+                     stdout=output, stderr=StringIO())
+        call_command('import_data', follows, kind='follows',
+                     stdout=output, stderr=StringIO())
+        self.assertEqual(cache.get('unrelated'), 'value')
+        self.assertEqual(len(search.PostResults('пост')), 2)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=reader).count(), 1)
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=writer).count(), 1)
+        self.assertEqual(writer.counters.posts_count, 1)
+        self.assertEqual(writer.counters.following_count, 1)
+        self.assertIn('создано 1,', output.getvalue().splitlines()[-2])
+        self.assertIn('пропущено (подписка уже есть): 2',
+                      output.getvalue())
+
+    def test_import_data_skips_ids_taken_by_archive(self):
+        writer = User.objects.create_user(username='writer')
+        now = timezone.now()
+        ArchivedPost.objects.create(
+            pk=100, author=writer, text='Архив', pub_date=now, updated=now)
+        posts = self.write('posts.jsonl', '\n'.join([
+            json.dumps({'id': 100, 'author': 'writer', 'text': 'Занят'}),
+            json.dumps({'id': 101, 'author': 'writer', 'text': 'Свободен'}),
+        ]))
+        output = StringIO()
+        call_command('import_data', posts, kind='posts',
+                     stdout=output, stderr=StringIO())
+        self.assertEqual(
+            list(Post.objects.values_list('pk', flat=True)), [101])
+        self.assertEqual(ArchivedPost.objects.get().text, 'Архив')
+        self.assertIn('пропущено (id занят архивным постом): 1',
+                      output.getvalue())
+
+    def test_import_data_skips_ids_taken_by_live_posts(self):
+        writer = User.objects.create_user(username='writer')
+        Post.objects.create(pk=100, author=writer, text='Живой')
+        posts = self.write('posts.jsonl', '\n'.join([
+            json.dumps({'id': 100, 'author': 'writer', 'text': 'Занят'}),
+            json.dumps({'id': 101, 'author': 'writer', 'text': 'Свободен'}),
+            json.dumps({'id': 101, 'author': 'writer', 'text': 'Повтор'}),
+        ]))
+        output = StringIO()
+        call_command('import_data', posts, kind='posts',
+                     stdout=output, stderr=StringIO())
+        self.assertEqual(
+            list(Post.objects.order_by('pk').values_list('text', flat=True)),
+            ['Живой', 'Свободен'])
+        self.assertIn('пропущено (id уже занят): 2', output.getvalue())
+
+
+class ExportPostsCommandTest(TestCase):
+    def test_export_posts_writes_group_posts_in_chunks(self):
+        author = User.objects.create_user(username='writer')
+        group = Group.objects.create(title='Горы', slug='mountains')
+        posts = [
+            Post.objects.create(author=author, group=group, text=f'Пост {n}')
+            for n in range(3)
+        ]
+        Post.objects.create(author=author, text='Без группы')
+        output = StringIO()
+        call_command('export_posts', group='mountains', chunk_size=2,
+                     stdout=output)
+        rows = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([row['id'] for row in rows],
+                         [post.pk for post in posts])
+
+
+class ProcessDeletionsCommandTest(TestCase):
+    def test_process_deletions_removes_user_and_reports_progress(self):
+        author = User.objects.create_user(username='writer')
+        post = Post.objects.create(author=author, text='Пост')
+        Comment.objects.create(post=post, author=author, text='Ответ')
+        output, progress = StringIO(), StringIO()
+        call_command('process_deletions', user=['writer'], batch_size=1,
+                     stdout=output, stderr=progress)
+        self.assertFalse(User.objects.filter(username='writer').exists())
+        self.assertFalse(Post.all_objects.exists())
+        self.assertIn('Завершено удалений: 1', output.getvalue())
+        self.assertIn('posts: удалено строк 2', progress.getvalue())
@@ -1,11 +1,13 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.models import Comment, Post
 
@@ -130,3 +132,48 @@ class PostPagesTest(TestCase):
             follow=True
         )
         self.assertEqual(Comment.objects.count(), comments_count)
+
+    def make_jpeg(self, size):
+        image = Image.new('RGB', size, 'green')
+        exif = Image.Exif()
+        exif[0x010F] = 'Тестовая камера'
+        output = BytesIO()
+        image.save(output, 'JPEG', exif=exif)
+        return SimpleUploadedFile(
+            name='photo.jpg',
+            content=output.getvalue(),
+            content_type='image/jpeg'
+        )
+
+    @override_settings(POST_IMAGE_MAX_SIDE=100)
+    def test_uploaded_image_is_downscaled_and_stripped(self):
+        """Оригинал уменьшается, перекодируется и теряет EXIF"""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с фото', 'image': self.make_jpeg((400, 300))}
+        )
+        post = Post.objects.get(text='Пост с фото')
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (100, 75))
+            self.assertEqual(stored.format, 'JPEG')
+            self.assertFalse(stored.getexif())
+
+    def test_too_large_uploads_are_rejected(self):
+        """Файл сверх лимита байт или пикселей не сохраняется"""
+        limits = {
+            'UPLOAD_MAX_BYTES': 100,
+            'POST_IMAGE_MAX_PIXELS': 100,
+        }
+        for setting, value in limits.items():
+            with self.subTest(setting=setting):
+                posts_count = Post.objects.count()
+                with self.settings(**{setting: value}):
+                    response = self.authorized_client.post(
+                        reverse('posts:post_create'),
+                        data={
+                            'text': 'Слишком большое фото',
+                            'image': self.make_jpeg((40, 40)),
+                        }
+                    )
+                self.assertTrue(response.context['form'].has_error('image'))
+                self.assertEqual(Post.objects.count(), posts_count)
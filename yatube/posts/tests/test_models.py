@@ -1,7 +1,14 @@
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
 
-from ..models import Group, Post
+from .. import search
+from ..counters import get_profile_summary, recount_all
+from ..deletion import delete_later, run_deletion
+from ..follows import FollowedAuthors
+from ..models import (ArchivedPost, Comment, Deletion, Follow, Group, Post,
+                      TimelineEntry, UserCounters)
+from ..stemmer import stem
 
 User = get_user_model()
 
@@ -51,3 +58,215 @@ class PostModelTest(TestCase):
             with self.subTest(label=label):
                 response = post._meta.get_field(label).help_text
                 self.assertEqual(response, help_text)
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def test_counters_follow_creates_and_deletes(self):
+        """Счётчики обновляются при создании и удалении объектов"""
+        post = Post.objects.create(author=self.user, text='Пост')
+        Post.objects.create(author=self.user, text='Ещё пост')
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(self.user.counters.posts_count, 2)
+        self.assertEqual(self.user.counters.followers_count, 1)
+        self.assertEqual(self.reader.counters.following_count, 1)
+
+        comment.delete()
+        follow.delete()
+        post.delete()
+        post = Post.objects.get(author=self.user)
+        self.assertEqual(post.comments_count, 0)
+        counters = UserCounters.objects.get(user=self.user)
+        self.assertEqual(counters.posts_count, 1)
+        self.assertEqual(counters.followers_count, 0)
+
+    def test_recount_all_repairs_counters(self):
+        post = Post.objects.create(author=self.user, text='Пост')
+        Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий')
+        UserCounters.objects.filter(user=self.user).update(posts_count=42)
+        Post.objects.filter(pk=post.pk).update(comments_count=7)
+        recount_all()
+        post.refresh_from_db()
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.user).posts_count, 1)
+
+    def test_profile_summary_is_cached_until_counters_change(self):
+        cache.clear()
+        post = Post.objects.create(author=self.user, text='Пост')
+        with self.assertNumQueries(1):
+            summary = get_profile_summary(self.user, FollowedAuthors())
+        self.assertEqual(summary['posts_count'], 1)
+        self.assertEqual(summary['latest_post'], post.pub_date)
+        self.assertFalse(summary['following'])
+        with self.assertNumQueries(0):
+            get_profile_summary(self.user, FollowedAuthors())
+
+        Follow.objects.create(user=self.reader, author=self.user)
+        summary = get_profile_summary(
+            self.user, FollowedAuthors([self.user.pk]))
+        self.assertEqual(summary['followers_count'], 1)
+        self.assertTrue(summary['following'])
+        self.assertEqual(get_profile_summary(
+            self.reader, FollowedAuthors())['following_count'], 1)
+
+
+class UpdatedTest(TestCase):
+    def test_updated_follows_every_save_path(self):
+        author = User.objects.create_user(username='writer')
+        post = Post.objects.create(author=author, text='Первый')
+        other = Post.objects.create(author=author, text='Второй')
+        Comment.objects.bulk_create(
+            [Comment(post=post, author=author, text='Комментарий')])
+        self.assertIsNotNone(Comment.objects.get().updated)
+        since = Post.objects.last_changed()
+        self.assertFalse(Post.objects.changed_since(since).exists())
+
+        post.text = 'Исправленный'
+        post.save()
+        self.assertEqual(list(Post.objects.changed_since(since)), [post])
+
+        since = Post.objects.last_changed()
+        other.text = 'Тоже исправленный'
+        Post.objects.bulk_update([other], ['text'])
+        self.assertEqual(list(Post.objects.changed_since(since)), [other])
+
+        since = Post.objects.last_changed()
+        Post.objects.filter(pk=post.pk).touch(group=None)
+        self.assertEqual(list(Post.objects.changed_since(since)), [post])
+
+
+class DeletionTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(title='Горы', slug='mountains')
+        self.post = Post.objects.create(
+            author=self.author, group=self.group, text='Пост')
+        self.other = Post.objects.create(author=self.reader, text='Чужой')
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=self.reader, text=str(n))
+            for n in range(5)
+        ] + [Comment(post=self.other, author=self.author, text='Ответ')])
+        recount_all()
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=self.author, author=self.reader)
+        TimelineEntry.objects.create(
+            user=self.reader, post=self.post, author=self.author,
+            pub_date=self.post.pub_date)
+
+    def test_post_is_hidden_at_once_and_removed_in_batches(self):
+        deletion = delete_later(self.post)
+        self.assertFalse(Post.objects.filter(pk=self.post.pk).exists())
+        self.assertEqual(Comment.objects.filter(post=self.post).count(), 5)
+
+        run_deletion(deletion.pk, batch_size=2)
+        deletion.refresh_from_db()
+        self.assertIsNotNone(deletion.finished)
+        self.assertEqual(deletion.removed, 7)
+        self.assertFalse(Post.all_objects.filter(pk=self.post.pk).exists())
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(self.author.counters.posts_count, 0)
+
+    def test_recount_between_hiding_and_deleting_post(self):
+        deletion = delete_later(self.post, background=False)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.author).posts_count, 0)
+        recount_all()
+        run_deletion(deletion.pk)
+        deletion.refresh_from_db()
+        self.assertIsNotNone(deletion.finished)
+        self.assertEqual(
+            UserCounters.objects.get(user=self.author).posts_count, 0)
+
+    def test_user_deletion_fixes_counters_of_others(self):
+        deletion = delete_later(self.author)
+        self.author.refresh_from_db()
+        self.assertFalse(self.author.is_active)
+        self.assertFalse(Post.objects.filter(author=self.author).exists())
+
+        run_deletion(deletion.pk, batch_size=2)
+        self.assertFalse(User.objects.filter(pk=self.author.pk).exists())
+        self.assertFalse(Comment.objects.exists())
+        self.assertFalse(Follow.objects.exists())
+        self.other.refresh_from_db()
+        self.assertEqual(self.other.comments_count, 0)
+        counters = UserCounters.objects.get(user=self.reader)
+        self.assertEqual(counters.followers_count, 0)
+        self.assertEqual(counters.following_count, 0)
+        self.assertEqual(counters.posts_count, 1)
+
+    def test_hidden_user_posts_leave_search(self):
+        archived = ArchivedPost.objects.create(
+            pk=1000, author=self.author, text='Архивный пост',
+            pub_date=self.post.pub_date, updated=self.post.updated)
+        search.index_post(archived)
+        self.assertEqual(len(search.PostResults('пост')), 2)
+        delete_later(self.author, background=False)
+        self.assertEqual(len(search.PostResults('пост')), 0)
+        self.assertEqual(len(search.PostResults('чужой')), 1)
+
+    def test_interrupted_deletion_resumes(self):
+        deletion = delete_later(self.group)
+        self.assertFalse(Group.objects.exists())
+        with self.assertRaises(RuntimeError):
+            run_deletion(deletion.pk, progress=self.fail_once)
+        self.assertTrue(Group.all_objects.filter(pk=self.group.pk).exists())
+
+        run_deletion(deletion.pk)
+        self.assertIsNotNone(Deletion.objects.get().finished)
+        self.assertFalse(Group.all_objects.exists())
+        self.post.refresh_from_db()
+        self.assertIsNone(self.post.group_id)
+
+    @staticmethod
+    def fail_once(deletion):
+        raise RuntimeError('Воркер остановлен')
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=self.author, text='Пост')
+
+    def test_renamed_author_is_reindexed(self):
+        self.author.first_name = 'Лев'
+        self.author.last_name = 'Толстой'
+        with self.settings(BACKGROUND_TASKS_EAGER=True):
+            self.author.save()
+        authors = search.search_authors('толстой')
+        self.assertEqual(list(authors), [self.author])
+        self.assertEqual(len(search.PostResults('лев толстой')), 1)
+
+    def test_rebuild_restores_lost_entries(self):
+        search.remove_author(self.author.pk)
+        search.remove_post(self.post.pk)
+        search.rebuild()
+        self.assertEqual(len(search.search_authors('author')), 1)
+        self.assertEqual(len(search.PostResults('пост')), 1)
+
+
+class StemmerTest(TestCase):
+    def test_russian_word_forms_share_stem(self):
+        words = {
+            'вагона': 'вагон',
+            'вагоне': 'вагон',
+            'важнейшие': 'важн',
+            'взволновали': 'взволнова',
+            'постов': 'пост',
+            'Ёлки': 'елк',
+            'python': 'python',
+        }
+        for word, expected in words.items():
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), expected)
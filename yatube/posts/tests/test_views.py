@@ -1,14 +1,34 @@
+import json
+import os
 import shutil
+import subprocess
 import tempfile
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
+from core import metrics
+from core.paginator import EstimatedCountPaginator
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from posts.archive import archive_cutoff, archive_posts
+from posts.counters import recount_user
+from posts.follows import follow, get_followed
 from posts.forms import PostForm
-from posts.models import Follow, Group, Post
+from posts.models import (ArchivedPost, Comment, Follow, Group, Post,
+                          TimelineEntry)
+from posts.thumbnails import generate_post_thumbnails
+from posts.timeline import backfill_timeline
+from sorl.thumbnail import get_thumbnail
 
 from yatube.settings import LIMIT_FOR_POSTS
 
@@ -40,6 +60,7 @@ class PostPagesTest(TestCase):
             b'\x02\x00\x01\x00\x00\x02\x02\x0C'
             b'\x0A\x00\x3B'
         )
+        cls.picture_bytes = picture_jpg_in_byte
         cls.picture = SimpleUploadedFile(
             name='picture.jpg',
             content=picture_jpg_in_byte,
@@ -148,19 +169,82 @@ class PostPagesTest(TestCase):
                 self.assertEqual(len(
                     response_2.context['page_obj']), self.POSTS_ON_SECOND_PAGE)
 
+    def test_cursor_paginator_walks_feeds_forward_and_back(self):
+        """Курсорная пагинация отдаёт страницы без пропусков и повторов"""
+        urls = {
+            'posts:index': None,
+            'posts:group_list': {'slug': self.group.slug},
+            'posts:profile': {'username': self.user.username},
+        }
+        for url, data in urls.items():
+            with self.subTest(url=url):
+                address = reverse(url, kwargs=data)
+                first = self.authorized_client.get(address).context[
+                    'page_obj']
+                self.assertEqual(len(first), self.POSTS_ON_FIRST_PAGE)
+                self.assertFalse(first.has_previous())
+                second = self.authorized_client.get(
+                    address, {'after': first.next_cursor}).context[
+                    'page_obj']
+                self.assertEqual(len(second), self.POSTS_ON_SECOND_PAGE)
+                self.assertFalse(second.has_next())
+                back = self.authorized_client.get(
+                    address, {'before': second.previous_cursor}).context[
+                    'page_obj']
+                self.assertEqual(
+                    [post.id for post in back],
+                    [post.id for post in first])
+                self.assertFalse(back.has_previous())
+                seen = [post.id for post in first] + [
+                    post.id for post in second]
+                self.assertEqual(len(set(seen)), len(seen))
+
+    def test_cursor_paginator_ignores_broken_cursor(self):
+        response = self.authorized_client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            {'after': 'not-a-cursor'})
+        self.assertEqual(len(
+            response.context['page_obj']), self.POSTS_ON_FIRST_PAGE)
+
     def test_index_page_caches_posts(self):
         cache.clear()
         response = self.authorized_client.get(reverse('posts:index'))
-        Post.objects.create(
-            text='Текст тестового поста',
-            author=self.user
-        )
+        Post.objects.update(text='Правка в обход сигналов')
         response_2 = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(response.content, response_2.content)
         cache.clear()
         response_3 = self.authorized_client.get(reverse('posts:index'))
         self.assertNotEqual(response_2.content, response_3.content)
 
+    def test_feed_caches_are_invalidated_by_new_post(self):
+        """Новый пост сразу сбрасывает кэш лент, которых он касается"""
+        cache.clear()
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user.username}),
+        ]
+        before = [self.guest_client.get(url).content for url in urls]
+        Post.objects.create(
+            text='Пост, который нельзя пропустить',
+            author=self.user,
+            group=self.group
+        )
+        for url, content in zip(urls, before):
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertNotEqual(response.content, content)
+                self.assertContains(
+                    response, 'Пост, который нельзя пропустить')
+
+    def test_feed_cache_varies_by_page(self):
+        cache.clear()
+        address = reverse('posts:index')
+        first = self.guest_client.get(address)
+        second = self.guest_client.get(
+            address, {'after': first.context['page_obj'].next_cursor})
+        self.assertNotEqual(first.content, second.content)
+
     def test_auth_user_can_follow_author(self):
         """Авторизованный пользователь может
         подписаться/отписаться на/от автора"""
@@ -173,6 +257,31 @@ class PostPagesTest(TestCase):
         unfollowing = Follow.objects.filter(user=self.user, author=self.user_2)
         self.assertFalse(unfollowing)
 
+    def test_follow_and_unfollow_are_idempotent(self):
+        """Повторная подписка и отписка не ломают счётчики и кэш подписок"""
+        cache.clear()
+        follow_url = reverse(
+            'posts:profile_follow', kwargs={'username': self.user_2})
+        unfollow_url = reverse(
+            'posts:profile_unfollow', kwargs={'username': self.user_2})
+        for _ in range(2):
+            response = self.authorized_client.get(follow_url)
+            self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.user_2.counters.followers_count, 1)
+        self.assertIn(self.user_2.pk, get_followed(self.user))
+        with self.assertNumQueries(0):
+            followed = get_followed(self.user)
+        self.assertEqual(list(followed), [self.user_2.pk])
+
+        for _ in range(2):
+            self.authorized_client.get(unfollow_url)
+        self.user_2.counters.refresh_from_db()
+        self.assertEqual(self.user_2.counters.followers_count, 0)
+        self.assertNotIn(self.user_2.pk, get_followed(self.user))
+        response = self.authorized_client.get(reverse(
+            'posts:profile_follow', kwargs={'username': 'nobody'}))
+        self.assertEqual(response.status_code, 404)
+
     def test_followers_can_see_new_posts_of_authors_they_follow(self):
         """Пользователи видят в ленте (в разделе избранные авторы) посты авторов,
          на которых они подписаны"""
@@ -186,3 +295,436 @@ class PostPagesTest(TestCase):
         self.assertEqual(
             response.context['page_obj'][0].author.username,
             self.user.username)
+
+    @override_settings(BACKGROUND_TASKS_EAGER=True, TIMELINE_MAX_LENGTH=12)
+    def test_follow_timeline_is_filled_on_create_and_pruned_on_unfollow(self):
+        """Новый пост попадает в ленту подписчика, отписка её очищает"""
+        authorized_client_2 = Client()
+        authorized_client_2.force_login(self.user_2)
+        authorized_client_2.get(reverse(
+            'posts:profile_follow', kwargs={'username': self.user}))
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user_2).count(), 12)
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Свежий пост для подписчиков'}
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.user_2).count(), 12)
+        response = authorized_client_2.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            response.context['page_obj'][0].text,
+            'Свежий пост для подписчиков')
+        authorized_client_2.get(reverse(
+            'posts:profile_unfollow', kwargs={'username': self.user}))
+        response = authorized_client_2.get(reverse('posts:follow_index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    @override_settings(BACKGROUND_TASKS_EAGER=True)
+    def test_posts_saved_outside_the_form_reach_followers(self):
+        """Пост из админки или shell тоже попадает в ленту подписчика"""
+        follow(self.user_2, self.user)
+        Post.objects.create(author=self.user, text='Пост из shell')
+        authorized_client_2 = Client()
+        authorized_client_2.force_login(self.user_2)
+        response = authorized_client_2.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            response.context['page_obj'][0].text, 'Пост из shell')
+
+    @override_settings(COMMENTS_PER_PAGE=2)
+    def test_post_detail_loads_comments_in_batches(self):
+        """Комментарии отдаются порциями, следующая - отдельным фрагментом"""
+        for number in range(3):
+            Comment.objects.create(
+                post=self.test_post,
+                author=self.user_2,
+                text=f'Комментарий {number}'
+            )
+        response = self.guest_client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': self.test_post.id}))
+        comments = response.context['comments']
+        self.assertEqual(
+            [comment.text for comment in comments],
+            ['Комментарий 0', 'Комментарий 1'])
+        self.assertTrue(comments.has_next())
+        address = reverse(
+            'posts:post_comments', kwargs={'post_id': self.test_post.id})
+        with self.assertNumQueries(2):
+            response = self.guest_client.get(
+                address, {'after': comments.next_cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comment_list.html')
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Комментарий 2'])
+        self.assertFalse(response.context['comments'].has_next())
+
+    def test_search_finds_posts_by_word_forms_groups_and_authors(self):
+        """Поиск учитывает словоформы и ищет по группам и авторам"""
+        post = Post.objects.create(
+            text='Путешествия по горным дорогам',
+            author=self.user_2
+        )
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'горная дорога'})
+        self.assertTemplateUsed(response, 'posts/search.html')
+        self.assertEqual(list(response.context['page_obj']), [post])
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'тестовые группы'})
+        self.assertEqual(response.context['groups'], [self.group])
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': self.user_2.username})
+        self.assertEqual(response.context['authors'], [self.user_2])
+        self.assertEqual(list(response.context['page_obj']), [post])
+        post.delete()
+        response = self.guest_client.get(
+            reverse('posts:search'), {'q': 'горная дорога'})
+        self.assertEqual(len(response.context['page_obj']), 0)
+
+    def test_feed_thumbnails_are_pregenerated_after_save(self):
+        """Миниатюра создаётся воркером, шаблон её только находит"""
+        def save_post(name):
+            return Post.objects.create(
+                text='Пост с картинкой',
+                author=self.user,
+                image=SimpleUploadedFile(
+                    name=name,
+                    content=self.picture_bytes,
+                    content_type='image/gif'
+                )
+            )
+
+        post = save_post('not_ready.gif')
+        thumbnail = get_thumbnail(
+            post.image, '960x339', crop='center', upscale=False)
+        self.assertEqual(thumbnail.name, post.image.name)
+        with self.settings(BACKGROUND_TASKS_EAGER=True):
+            post = save_post('ready.gif')
+        thumbnail = get_thumbnail(
+            post.image, '960x339', crop='center', upscale=False)
+        self.assertNotEqual(thumbnail.name, post.image.name)
+        self.assertTrue(thumbnail.exists())
+
+    def test_cached_pages_switch_to_generated_thumbnails(self):
+        """Готовая миниатюра сразу появляется на закэшированных страницах"""
+        cache.clear()
+        post = Post.objects.create(
+            text='Пост с картинкой', author=self.user,
+            image=SimpleUploadedFile(
+                name='late.gif', content=self.picture_bytes,
+                content_type='image/gif'))
+        url = reverse('posts:index')
+        response = self.guest_client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertContains(response, post.image.url)
+        generate_post_thumbnails([post.pk])
+        thumbnail = get_thumbnail(
+            post.image, '960x339', crop='center', upscale=False)
+        self.assertNotEqual(thumbnail.name, post.image.name)
+        self.assertContains(self.guest_client.get(url), thumbnail.url)
+
+    def test_generate_thumbnails_covers_archived_posts(self):
+        """Команда создаёт миниатюры и для архивных постов"""
+        post = Post.objects.create(
+            text='Старый пост с картинкой', author=self.user,
+            image=SimpleUploadedFile(
+                name='old.gif', content=self.picture_bytes,
+                content_type='image/gif'))
+        Post.objects.filter(pk=post.pk).update(
+            pub_date=timezone.now() - timedelta(days=100))
+        archive_posts(archive_cutoff(30))
+        archived = ArchivedPost.objects.get(pk=post.pk)
+        call_command('generate_thumbnails', workers=0, stdout=StringIO())
+        thumbnail = get_thumbnail(
+            archived.image, '960x339', crop='center', upscale=False)
+        self.assertNotEqual(thumbnail.name, archived.image.name)
+
+    def test_export_streams_author_and_group_posts(self):
+        """Выгрузка постов автора и группы отдаётся потоком"""
+        url = reverse('posts:profile_export',
+                      kwargs={'username': self.user.username})
+        self.assertEqual(self.guest_client.get(url).status_code, 302)
+        response = self.authorized_client.get(url)
+        self.assertTrue(response.streaming)
+        rows = [
+            json.loads(line) for line in
+            b''.join(response.streaming_content).decode().splitlines()
+        ]
+        post_ids = list(self.user.posts.order_by('pk').values_list(
+            'pk', flat=True))
+        self.assertEqual([row['id'] for row in rows], post_ids)
+        self.assertEqual(rows[0]['author'], self.user.username)
+        self.assertEqual(rows[0]['group'], self.group.slug)
+        response = self.authorized_client.get(
+            reverse('posts:group_export', kwargs={'slug': self.group.slug}),
+            {'format': 'csv'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'id,pub_date,updated,author,group,text,'
+                                   'image,comments_count')
+        self.assertEqual(len(lines) - 1, self.group.posts.count())
+
+    def test_conditional_get_returns_not_modified_until_change(self):
+        """Неизменившаяся страница отдаётся как 304 без запросов ленты"""
+        cache.clear()
+        url = reverse('posts:index')
+        response = self.guest_client.get(url)
+        self.assertTrue(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertNotEqual(
+            self.authorized_client.get(
+                url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        Post.objects.create(text='Новый пост', author=self.user_2)
+        self.assertEqual(
+            self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            200)
+
+        url = reverse('posts:post_detail', kwargs={'post_id': 1})
+        etag = self.guest_client.get(url)['ETag']
+        self.assertEqual(
+            self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            304)
+        Comment.objects.create(
+            post=self.test_post, author=self.user_2, text='Комментарий')
+        self.assertEqual(
+            self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code,
+            200)
+
+    def test_post_cards_are_shared_between_feeds(self):
+        """Карточки постов берутся из общего кэша, пока пост не изменён"""
+        cache.clear()
+        registry = metrics.Registry()
+        labels = (('view', 'posts:profile'),)
+        url = reverse('posts:profile', kwargs={'username': self.user})
+        with mock.patch.object(metrics, 'registry', registry):
+            self.guest_client.get(url)
+            self.assertEqual(registry.counters[
+                ('yatube_post_card_cache_misses_total', labels)],
+                LIMIT_FOR_POSTS)
+            self.guest_client.get(url, {'page': 1})
+            self.assertEqual(registry.counters[
+                ('yatube_post_card_cache_hits_total', labels)],
+                LIMIT_FOR_POSTS)
+        post = self.user.posts.first()
+        post.text = 'Исправленный текст'
+        post.save()
+        response = self.guest_client.get(url, {'page': 1})
+        self.assertContains(response, 'Исправленный текст')
+
+    def test_anonymous_pages_are_cached_until_purged(self):
+        """Анонимы получают страницу из кэша, пока её не сбросит запись"""
+        cache.clear()
+        # Ответ, который что-то записал, уходит с cookie реплик и в кэш
+        # не попадает, поэтому счётчики автора создаются заранее
+        recount_user(self.test_post.author_id)
+        url = reverse('posts:post_detail', kwargs={'post_id': 1})
+        response = self.guest_client.get(url)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        with self.assertNumQueries(0):
+            cached = self.guest_client.get(url)
+        self.assertEqual(cached.content, response.content)
+        self.assertIn(
+            'private', self.authorized_client.get(url)['Cache-Control'])
+        Comment.objects.create(
+            post=self.test_post, author=self.user_2, text='Свежий комментарий')
+        self.assertContains(self.guest_client.get(url), 'Свежий комментарий')
+        Post.objects.create(text='Пост после кэша', author=self.user)
+        self.assertContains(
+            self.guest_client.get(reverse('posts:index')), 'Пост после кэша')
+
+    def test_anonymous_pages_with_cyrillic_paths_are_purged(self):
+        """Сброс находит страницы с кириллицей в адресе"""
+        cache.clear()
+        author = User.objects.create_user(username='вася')
+        recount_user(author.pk)
+        url = reverse('posts:profile', kwargs={'username': 'вася'})
+        self.assertIn(
+            'public', self.guest_client.get(url)['Cache-Control'])
+        Post.objects.create(text='Свежий пост васи', author=author)
+        self.assertContains(self.guest_client.get(url), 'Свежий пост васи')
+
+    def test_metrics_endpoint_aggregates_views_across_processes(self):
+        """/metrics отдаёт метрики по URL-именам из снимков всех процессов"""
+        metrics_dir = os.path.join(TEMP_MEDIA_ROOT, 'metrics')
+        os.makedirs(metrics_dir)
+        with open(os.path.join(metrics_dir, 'metrics-1.json'), 'w') as other:
+            json.dump({'counters': [[
+                'yatube_sql_queries_total', {'view': 'posts:index'}, 10
+            ]], 'histograms': []}, other)
+        cache.clear()
+        with self.settings(METRICS_DIR=metrics_dir), mock.patch.object(
+                metrics, 'registry', metrics.Registry()):
+            self.guest_client.get(reverse('posts:index'))
+            self.authorized_client.get(reverse('posts:index'))
+            self.assertEqual(
+                self.guest_client.get(
+                    reverse('metrics'), REMOTE_ADDR='10.0.0.1'
+                ).status_code, 403)
+            self.assertEqual(
+                self.guest_client.get(
+                    reverse('metrics'), HTTP_X_FORWARDED_FOR='10.0.0.1'
+                ).status_code, 403)
+            response = self.guest_client.get(reverse('metrics'))
+        lines = response.content.decode().splitlines()
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 2',
+            lines)
+        self.assertIn(
+            'yatube_fragment_cache_misses_total'
+            '{fragment="index.page",view="posts:index"} 1.0', lines)
+        self.assertIn(
+            'yatube_fragment_cache_hits_total'
+            '{fragment="index.page",view="posts:index"} 1.0', lines)
+        self.assertIn(
+            'yatube_template_render_seconds_count{view="posts:index"} 2',
+            lines)
+        queries = [
+            line for line in lines
+            if line.startswith('yatube_sql_queries_total{view="posts:index"}')
+        ]
+        self.assertEqual(len(queries), 1)
+        self.assertGreater(float(queries[0].split()[-1]), 10)
+
+    def test_metrics_drop_snapshots_of_finished_processes(self):
+        """Снимок завершившегося процесса удаляется и не суммируется"""
+        metrics_dir = os.path.join(TEMP_MEDIA_ROOT, 'stale-metrics')
+        os.makedirs(metrics_dir)
+        finished = subprocess.Popen(['true'])
+        finished.wait()
+        path = os.path.join(metrics_dir, f'metrics-{finished.pid}.json')
+        with open(path, 'w') as stale:
+            json.dump({'counters': [[
+                'yatube_sql_queries_total', {'view': 'stale'}, 10
+            ]], 'histograms': []}, stale)
+        with self.settings(METRICS_DIR=metrics_dir), mock.patch.object(
+                metrics, 'registry', metrics.Registry()):
+            counters, _ = metrics.collect()
+        self.assertNotIn(
+            ('yatube_sql_queries_total', (('view', 'stale'),)), counters)
+        self.assertFalse(os.path.exists(path))
+
+
+class CacheInvalidationOnCommitTest(TransactionTestCase):
+    def test_cache_filled_before_commit_is_forgotten(self):
+        """Кэш, заполненный до COMMIT старыми данными, сбрасывается"""
+        cache.clear()
+        user = User.objects.create_user(username='reader')
+        author = User.objects.create_user(username='author')
+        with transaction.atomic():
+            Follow.objects.create(user=user, author=author)
+            # Параллельный запрос ещё не видит подписку и кэширует её
+            # отсутствие
+            cache.set(f'followed_authors:{user.pk}', b'')
+        self.assertIn(author.pk, get_followed(user))
+
+
+class AdminChangelistTest(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='pass')
+        self.client.force_login(self.admin)
+
+    def add_rows(self, count):
+        for _ in range(count):
+            number = User.objects.count()
+            author = User.objects.create_user(username=f'user{number}')
+            group = Group.objects.create(
+                title=f'Группа {number}', slug=f'group-{number}',
+                description='Описание')
+            post = Post.objects.create(text='Текст', author=author,
+                                       group=group)
+            Comment.objects.create(post=post, author=author, text='Текст')
+
+    def changelist_queries(self, model):
+        url = reverse(f'admin:posts_{model}_changelist')
+        with CaptureQueriesContext(connection) as context:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(context.captured_queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Число запросов списка в админке не зависит от числа строк"""
+        self.add_rows(2)
+        post_queries = self.changelist_queries('post')
+        comment_queries = self.changelist_queries('comment')
+        self.add_rows(5)
+        self.assertEqual(self.changelist_queries('post'), post_queries)
+        self.assertEqual(self.changelist_queries('comment'), comment_queries)
+
+    def test_paginator_estimates_unfiltered_posts(self):
+        """Без фильтров число постов оценивается, с фильтром - обрезается"""
+        self.add_rows(4)
+        with mock.patch.object(EstimatedCountPaginator, 'EXACT_LIMIT', 2):
+            everything = EstimatedCountPaginator(Post.objects.all(), 1)
+            self.assertEqual(everything.count, 4)
+            self.assertEqual(everything.page(4).object_list.count(), 1)
+            filtered = EstimatedCountPaginator(
+                Post.objects.filter(text='Текст'), 1)
+            self.assertEqual(filtered.count, 2)
+
+
+@override_settings(LIMIT_FOR_POSTS=2)
+class ArchiveTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.client.force_login(self.reader)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.posts = [
+            Post.objects.create(author=self.author, text=f'Пост {number}')
+            for number in range(4)
+        ]
+        old = self.posts[:3]
+        for age, post in enumerate(reversed(old), start=100):
+            Post.objects.filter(pk=post.pk).update(
+                pub_date=timezone.now() - timedelta(days=age))
+        Comment.objects.create(
+            post=old[0], author=self.reader, text='Старый комментарий')
+        backfill_timeline(self.reader, self.author)
+        self.assertEqual(archive_posts(archive_cutoff(30), batch_size=2), 3)
+
+    def feed_texts(self, url):
+        texts = []
+        while url:
+            page = self.client.get(url).context['page_obj']
+            texts.extend(post.text for post in page)
+            url = page.has_next() and f'?after={page.next_cursor}'
+        return texts
+
+    def test_feeds_continue_into_archive(self):
+        """Ленты дочитывают архив после живых постов"""
+        self.assertEqual(Post.objects.count(), 1)
+        expected = [post.text for post in reversed(self.posts)]
+        for name, kwargs in (('posts:index', {}),
+                             ('posts:profile', {'username': 'author'}),
+                             ('posts:follow_index', {})):
+            with self.subTest(name=name):
+                url = reverse(name, kwargs=kwargs)
+                self.assertEqual(self.feed_texts(url), expected)
+        self.assertEqual(self.author.counters.posts_count, 4)
+
+    def test_archived_post_detail_is_read_only(self):
+        """Архивный пост открывается по прежнему адресу, без формы"""
+        post = ArchivedPost.objects.get(pk=self.posts[0].pk)
+        self.assertEqual(post.comments_count, 1)
+        response = self.client.get(reverse(
+            'posts:post_detail', kwargs={'post_id': post.pk}))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['archived'])
+        self.assertEqual(
+            [comment.text for comment in response.context['comments']],
+            ['Старый комментарий'])
+        self.assertNotContains(
+            response, reverse('posts:add_comment', args=[post.pk]))
+
+    def test_export_includes_archived_posts(self):
+        """Выгрузка профиля содержит и архивные посты по возрастанию id"""
+        response = self.client.get(reverse(
+            'posts:profile_export', kwargs={'username': 'author'}))
+        rows = [json.loads(line) for line in b''.join(
+            response.streaming_content).decode().splitlines()]
+        self.assertEqual([row['id'] for row in rows],
+                         [post.pk for post in self.posts])
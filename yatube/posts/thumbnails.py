@@ -0,0 +1,89 @@
+"""Миниатюры картинок постов, которые создаются заранее.
+
+Шаблоны по-прежнему используют {% thumbnail %}, но с
+PregeneratedThumbnailBackend тег только ищет готовый файл в kvstore
+sorl-thumbnail. Создаёт миниатюры generate_post_thumbnails в пуле
+процессов после сохранения поста или команда generate_thumbnails.
+"""
+import logging
+
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as default_settings
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile
+
+from .caching import (bump_generations, forget_cards, post_scope,
+                      post_scopes, purge_post_pages)
+from .models import ArchivedPost, Post
+
+logger = logging.getLogger(__name__)
+
+# Все размеры, которые запрашивают шаблоны лент и страницы поста
+FEED_THUMBNAILS = (
+    ('960x339', {'crop': 'center', 'upscale': False}),
+)
+
+
+class PregeneratedThumbnailBackend(ThumbnailBackend):
+    """Отдаёт только готовые миниатюры, ничего не создаёт в запросе.
+
+    Если миниатюры ещё нет, возвращается исходная картинка.
+    """
+
+    def _thumbnail_file(self, source, geometry_string, options):
+        if thumbnail_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(thumbnail_settings, attr)
+            if value != getattr(default_settings, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        source = ImageFile(file_)
+        thumbnail = self._thumbnail_file(source, geometry_string, options)
+        cached = default.kvstore.get(thumbnail)
+        if cached:
+            return cached
+        logger.debug('Миниатюра %s для %s ещё не готова',
+                     geometry_string, source.name)
+        return source
+
+
+def generate_thumbnails(image):
+    lookup = PregeneratedThumbnailBackend()
+    backend = ThumbnailBackend()
+    source = ImageFile(image)
+    for geometry, options in FEED_THUMBNAILS:
+        thumbnail = lookup._thumbnail_file(source, geometry, dict(options))
+        # Запись в kvstore без файла (например, после очистки media/cache)
+        # иначе помешала бы создать миниатюру заново.
+        if not thumbnail.exists():
+            default.kvstore.delete(thumbnail)
+        backend.get_thumbnail(image, geometry, **options)
+
+
+def generate_post_thumbnails(post_ids):
+    """Создаёт все миниатюры для картинок постов, в том числе архивных."""
+    for model in (Post, ArchivedPost):
+        posts = model.objects.filter(pk__in=post_ids).exclude(image='')
+        for post in posts.only('id', 'image', 'author_id', 'group_id'):
+            try:
+                generate_thumbnails(post.image)
+            except Exception:
+                logger.exception(
+                    'Не удалось создать миниатюры поста %s', post.pk)
+                continue
+            # Карточки, фрагменты лент и анонимные страницы ссылаются на
+            # исходную картинку, пока их не сбросить
+            bump_generations(
+                post_scope(post.pk),
+                *post_scopes(post.author_id, post.group_id))
+            purge_post_pages(post.pk, post.author_id, post.group_id)
+    forget_cards(post_ids)
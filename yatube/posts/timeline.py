@@ -0,0 +1,85 @@
+from django.conf import settings
+from django.db.models import Q
+
+from .models import Follow, Post, TimelineEntry
+
+
+def trim_timeline(user_id):
+    """Оставляет в ленте пользователя не больше TIMELINE_MAX_LENGTH записей."""
+    cutoff = (
+        TimelineEntry.objects
+        .filter(user_id=user_id)
+        .order_by('-pub_date', '-id')
+        .values_list('pub_date', 'id')[settings.TIMELINE_MAX_LENGTH:]
+        .first()
+    )
+    if cutoff is None:
+        return
+    pub_date, pk = cutoff
+    TimelineEntry.objects.filter(
+        Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, id__lte=pk),
+        user_id=user_id,
+    ).delete()
+
+
+def fan_out_post(post_id):
+    """Раскладывает новый пост по лентам всех подписчиков автора."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None:
+        return
+    follower_ids = list(
+        Follow.objects
+        .filter(author_id=post.author_id)
+        .values_list('user_id', flat=True)
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                user_id=user_id,
+                post=post,
+                author_id=post.author_id,
+                pub_date=post.pub_date
+            )
+            for user_id in follower_ids
+        ],
+        batch_size=500,
+        ignore_conflicts=True
+    )
+    for user_id in follower_ids:
+        trim_timeline(user_id)
+
+
+def backfill_timeline(user, author):
+    """Добавляет в ленту подписчика последние посты автора."""
+    posts = (
+        Post.objects
+        .filter(author=author)
+        .order_by('-pub_date', '-id')
+        .values_list('id', 'pub_date')[:settings.TIMELINE_MAX_LENGTH]
+    )
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(
+                user=user,
+                post_id=post_id,
+                author=author,
+                pub_date=pub_date
+            )
+            for post_id, pub_date in posts
+        ],
+        batch_size=500,
+        ignore_conflicts=True
+    )
+    trim_timeline(user.id)
+
+
+def prune_timeline(user, author):
+    """Убирает из ленты пользователя посты автора после отписки."""
+    TimelineEntry.objects.filter(user=user, author=author).delete()
+
+
+def rebuild_timeline(user):
+    """Пересобирает ленту пользователя с нуля по текущим подпискам."""
+    TimelineEntry.objects.filter(user=user).delete()
+    for follow in Follow.objects.filter(user=user).select_related('author'):
+        backfill_timeline(user, follow.author)
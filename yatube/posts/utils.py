@@ -1,8 +1,152 @@
+import base64
+import binascii
+
+from django.conf import settings
 from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
 
 
 def paginator(request, posts):
-    paginator = Paginator(posts, 10)
+    paginator = Paginator(posts, settings.LIMIT_FOR_POSTS)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
+
+
+def encode_cursor(obj, field='pub_date'):
+    """Кодирует позицию записи в ленте (дата, id) в строку для URL."""
+    raw = '{}|{}'.format(getattr(obj, field).isoformat(), obj.pk)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (pub_date, id) из курсора или None, если он испорчен."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(
+            cursor + '=' * (-len(cursor) % 4)).decode()
+        pub_date, pk = raw.rsplit('|', 1)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+class CursorPage:
+    """Страница ленты, выбранная по курсору без COUNT и OFFSET."""
+    is_cursor_page = True
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+def _cursor_rows(queryset, cursor, older, limit):
+    """Строки queryset по одну сторону от курсора в порядке обхода."""
+    if older:
+        queryset = queryset.order_by('-pub_date', '-pk')
+        if cursor is not None:
+            pub_date, pk = cursor
+            queryset = queryset.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk))
+    else:
+        pub_date, pk = cursor
+        queryset = queryset.filter(
+            Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+        ).order_by('pub_date', 'pk')
+    return list(queryset[:limit])
+
+
+def cursor_paginator(request, queryset, per_page=None, transform=None,
+                     archive=None):
+    """Пагинация по ключу (pub_date, id).
+
+    ?after=<курсор> отдаёт записи старше курсора, ?before=<курсор> - новее.
+    Стоимость запроса не зависит от глубины страницы. transform позволяет
+    показать вместо строк queryset связанные с ними объекты, например
+    посты вместо записей ленты. archive - более старые записи из архива:
+    их читают, только когда страница не заполнилась из queryset.
+    """
+    per_page = per_page or settings.LIMIT_FOR_POSTS
+    after = decode_cursor(request.GET.get('after'))
+    before = decode_cursor(request.GET.get('before'))
+    sources = [queryset] if archive is None else [queryset, archive]
+    rows = []
+    limit = per_page + 1
+    if before is not None:
+        for source in reversed(sources):
+            rows += _cursor_rows(source, before, False, limit - len(rows))
+            if len(rows) == limit:
+                break
+        has_previous = len(rows) > per_page
+        rows = rows[:per_page]
+        rows.reverse()
+        has_next = True
+    else:
+        for source in sources:
+            rows += _cursor_rows(source, after, True, limit - len(rows))
+            if len(rows) == limit:
+                break
+        has_next = len(rows) > per_page
+        has_previous = after is not None
+        rows = rows[:per_page]
+    next_cursor = previous_cursor = None
+    if rows:
+        if has_next:
+            next_cursor = encode_cursor(rows[-1])
+        if has_previous:
+            previous_cursor = encode_cursor(rows[0])
+    object_list = transform(rows) if transform else rows
+    return CursorPage(object_list, next_cursor, previous_cursor)
+
+
+def comments_paginator(request, comments, per_page=None):
+    """Порция комментариев от старых к новым после курсора ?after=."""
+    per_page = per_page or settings.COMMENTS_PER_PAGE
+    after = decode_cursor(request.GET.get('after'))
+    comments = comments.order_by('created', 'pk')
+    if after is not None:
+        created, pk = after
+        comments = comments.filter(
+            Q(created__gt=created) | Q(created=created, pk__gt=pk))
+    rows = list(comments[:per_page + 1])
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1], 'created')
+    return CursorPage(rows, next_cursor)
+
+
+def feed_paginator(request, posts, archive=None):
+    """Курсорная пагинация для лент.
+
+    Нумерованные ссылки ?page=N продолжают работать для небольших лент
+    и старых закладок, но показывают только посты из живой таблицы.
+    """
+    if 'page' in request.GET:
+        return paginator(request, posts)
+    return cursor_paginator(request, posts, archive=archive)
@@ -1,70 +1,164 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-
+from django.utils.functional import SimpleLazyObject
+
+from .caching import (FEED_SCOPE, author_scope, feed_cache_context,
+                      group_scope)
+from .conditional import (conditional_page, group_scopes, index_scopes,
+                          post_detail_scopes, profile_scopes)
+from .counters import get_profile_summary, get_user_counters
+from .export import FORMATS, export_lines
+from .follows import follow, get_followed, unfollow
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post, User
-from .utils import paginator
+from .models import ArchivedPost, Follow, Group, Post, TimelineEntry, User
+from .search import PostResults, search_authors, search_groups
+from .utils import comments_paginator, cursor_paginator, feed_paginator
 
 
+@conditional_page(index_scopes)
 def index(request):
     posts = Post.objects.select_related('author', 'group')
-    page_obj = paginator(request, posts)
+    archive = ArchivedPost.objects.select_related('author', 'group')
+    page_obj = SimpleLazyObject(
+        lambda: feed_paginator(request, posts, archive))
     template = 'posts/index.html'
     context = {
         'page_obj': page_obj,
+        **feed_cache_context(request, FEED_SCOPE),
     }
     return render(request, template, context)
 
 
+@conditional_page(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author')
+    archive = group.archived_posts.select_related('author')
     template = 'posts/group_list.html'
-    page_obj = paginator(request, posts)
+    page_obj = SimpleLazyObject(
+        lambda: feed_paginator(request, posts, archive))
     context = {
         'group': group,
         'page_obj': page_obj,
+        **feed_cache_context(request, group_scope(group.pk)),
     }
     return render(request, template, context)
 
 
+@conditional_page(profile_scopes)
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    posts = Post.objects.filter(author=author)
-    page_obj = paginator(request, posts)
+    posts = Post.objects.filter(author=author).select_related(
+        'author', 'group')
+    archive = ArchivedPost.objects.filter(author=author).select_related(
+        'author', 'group')
+    page_obj = SimpleLazyObject(
+        lambda: feed_paginator(request, posts, archive))
     template = 'posts/profile.html'
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(
-            user=request.user, author=author).exists
-    else:
-        following = False
     context = {
         'author': author,
+        'summary': get_profile_summary(author, get_followed(request.user)),
         'page_obj': page_obj,
-        'posts': posts,
-        'following': following,
+        **feed_cache_context(request, author_scope(author.pk)),
     }
     return render(request, template, context)
 
 
+def _export_response(request, posts, archive, name):
+    fmt = request.GET.get('format', 'jsonl')
+    if fmt not in FORMATS:
+        raise Http404
+    response = StreamingHttpResponse(
+        export_lines(posts, fmt, archive=archive), content_type=FORMATS[fmt])
+    response['Content-Disposition'] = (
+        f'attachment; filename="{name}-posts.{fmt}"')
+    return response
+
+
+@login_required
+def profile_export(request, username):
+    author = get_object_or_404(User, username=username)
+    return _export_response(
+        request, author.posts.all(), author.archived_posts.all(),
+        author.username)
+
+
+@login_required
+def group_export(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return _export_response(
+        request, group.posts.all(), group.archived_posts.all(), group.slug)
+
+
+def _post_or_archived(post_id, *related):
+    """Пост из живой таблицы или, если его уже перенесли, из архива."""
+    for model in (Post, ArchivedPost):
+        post = model.objects.select_related(*related).filter(
+            pk=post_id).first()
+        if post is not None:
+            return post
+    raise Http404
+
+
+@conditional_page(post_detail_scopes)
 def post_detail(request, post_id):
-    page_obj = get_object_or_404(Post, id=post_id)
+    page_obj = _post_or_archived(post_id, 'author__counters', 'group')
     form = CommentForm(request.POST or None)
-    comments = Comment.objects.select_related('post').filter(post=post_id)
+    comments = comments_paginator(
+        request, page_obj.comments.select_related('author'))
     template = 'posts/post_detail.html'
     context = {
         'page_obj': page_obj,
+        'author_counters': get_user_counters(page_obj.author),
+        'archived': isinstance(page_obj, ArchivedPost),
         'form': form,
         'comments': comments,
     }
     return render(request, template, context)
 
 
+def post_comments(request, post_id):
+    post = _post_or_archived(post_id)
+    comments = comments_paginator(
+        request, post.comments.select_related('author'))
+    template = 'posts/includes/comment_list.html'
+    context = {
+        'post': post,
+        'comments': comments,
+    }
+    return render(request, template, context)
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = Paginator(
+        PostResults(query), settings.LIMIT_FOR_POSTS
+    ).get_page(request.GET.get('page'))
+    template = 'posts/search.html'
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'groups': search_groups(query),
+        'authors': search_authors(query),
+        'followed': get_followed(request.user),
+        'paginator_query': urlencode({'q': query}) + '&',
+    }
+    return render(request, template, context)
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(
         request.POST or None,
-        files=request.FILES or None
+        files=request.FILES or None,
+        rejected_uploads=getattr(request, 'rejected_uploads', ())
     )
     if form.is_valid():
         post = form.save(commit=False)
@@ -83,7 +177,8 @@ def post_edit(request, post_id):
     form = PostForm(
         request.POST or None,
         files=request.FILES or None,
-        instance=post
+        instance=post,
+        rejected_uploads=getattr(request, 'rejected_uploads', ())
     )
     if form.is_valid():
         form.save()
@@ -97,6 +192,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -110,11 +206,20 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = (
-        Post.objects
+    entries = (
+        TimelineEntry.objects
+        .select_related('post__author', 'post__group')
+        .filter(user=request.user, post__is_deleted=False))
+    archive = (
+        ArchivedPost.objects
         .select_related('author', 'group')
-        .filter(author__following__user=request.user))
-    page_obj = paginator(request, posts)
+        .filter(author__in=Follow.objects.filter(
+            user=request.user).values('author')))
+    page_obj = cursor_paginator(
+        request, entries, archive=archive,
+        transform=lambda rows: [
+            row.post if isinstance(row, TimelineEntry) else row
+            for row in rows])
     template = 'posts/follow.html'
     context = {
         'page_obj': page_obj,
@@ -124,16 +229,13 @@ def follow_index(request):
 
 @login_required
 def profile_follow(request, username):
-    author = User.objects.get(username=username)
-    if request.user != author:
-        Follow.objects.create(user=request.user, author=author)
-    return redirect('posts:profile', username=author)
+    author = get_object_or_404(User, username=username)
+    follow(request.user, author)
+    return redirect('posts:profile', username=author.username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    author = User.objects.get(username=username)
-    is_follower = Follow.objects.filter(user=request.user, author=author)
-    if is_follower.exists():
-        is_follower.delete()
-    return redirect('posts:profile', username=author)
+    author = get_object_or_404(User, username=username)
+    unfollow(request.user, author)
+    return redirect('posts:profile', username=author.username)
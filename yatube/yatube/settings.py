@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
 import os
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -51,6 +52,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.pagecache.AnonymousPageCacheMiddleware',
+    'core.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,7 +69,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -90,9 +94,45 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {'timeout': 20},
     }
 }
 
+# Применяются к каждому соединению SQLite, см. core.sqlite
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64 * 1024,
+    'busy_timeout': 20000,
+    'temp_store': 'MEMORY',
+}
+
+# Реплики для чтения: DATABASE_REPLICAS='путь[:вес],путь[:вес]'.
+# Локально это копии db.sqlite3, их обновляет команда sync_replicas.
+DATABASE_REPLICAS = {}
+for number, replica in enumerate(
+        filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')),
+        start=1):
+    replica_path, _, replica_weight = replica.partition(':')
+    DATABASES['replica{}'.format(number)] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': replica_path,
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {'timeout': 20},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS['replica{}'.format(number)] = int(replica_weight or 1)
+
+DATABASE_ROUTERS = ['core.db_router.ReplicaRouter']
+
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
+# Сколько секунд после своей записи пользователь читает с default
+REPLICA_STICKY_SECONDS = 5
+REPLICA_STICKY_COOKIE = 'use_primary'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -133,19 +173,104 @@ USE_TZ = True
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Загрузки читаются потоком: файлы больше UPLOAD_MAX_BYTES отбрасываются
+# по ходу приёма, остальные крупнее FILE_UPLOAD_MAX_MEMORY_SIZE идут
+# во временный файл на диске.
+FILE_UPLOAD_HANDLERS = [
+    'core.uploadhandlers.UploadSizeLimitHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+UPLOAD_MAX_BYTES = 15 * 1024 * 1024
+
+# Картинки постов: лимит по пикселям и размер хранимого оригинала
+POST_IMAGE_MAX_PIXELS = 50 * 1000 * 1000
+POST_IMAGE_MAX_SIDE = 1920
+POST_IMAGE_QUALITY = 85
+
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
 LIMIT_FOR_POSTS = 10
 
+COMMENTS_PER_PAGE = 50
+
+# Сколько последних постов хранится в материализованной ленте подписок
+TIMELINE_MAX_LENGTH = 1000
+
+# Фоновые задачи core.tasks.defer: True - выполнять сразу, без потоков
+BACKGROUND_TASKS_EAGER = False
+BACKGROUND_TASK_WORKERS = 2
+BACKGROUND_PROCESS_WORKERS = 2
+
+# Посты старше стольких дней archive_posts переносит в архивные таблицы
+ARCHIVE_AFTER_DAYS = 60
+ARCHIVE_BATCH_SIZE = 500
+
+# Сколько строк удаляет одна транзакция фонового удаления (posts.deletion)
+DELETION_BATCH_SIZE = 500
+
+# Миниатюры создаются заранее воркером, шаблоны только ищут готовые
+THUMBNAIL_BACKEND = 'posts.thumbnails.PregeneratedThumbnailBackend'
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
 
+# Фрагменты лент сбрасываются счётчиками поколений, TTL - страховка
+FEED_CACHE_TIMEOUT = 60 * 60 * 3
+
+# core.stampede: сколько отдавать устаревшую копию, пока один воркер
+# пересчитывает значение, и как долго ждать его результата
+CACHE_STALE_TIMEOUT = 60
+CACHE_LOCK_TIMEOUT = 30
+CACHE_LOCK_WAIT = 2
+CACHE_EARLY_EXPIRY_BETA = 1.0
+
+# Полностраничный кэш для анонимов, сбрасывается сигналами posts;
+# MAX_AGE - сколько страницу могут хранить браузеры и прокси
+ANONYMOUS_PAGE_CACHE_VIEWS = [
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+]
+ANONYMOUS_PAGE_CACHE_TIMEOUT = 60 * 10
+ANONYMOUS_PAGE_CACHE_MAX_AGE = 60
+
+# Карточки постов сбрасываются по версии поста, TTL - страховка
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+
+# Шапка профиля сбрасывается при изменении счётчиков, TTL - страховка
+PROFILE_SUMMARY_TIMEOUT = 60 * 60 * 24
+
+# Кэш id авторов, на которых подписан пользователь (posts.follows)
+FOLLOWED_AUTHORS_TIMEOUT = 60 * 60 * 24
+
+# Общий для всех воркеров кэш в файле SQLite, см. core.cache. Тесты и
+# benchmark_views работают с копией во временном каталоге, см.
+# core.test_runner
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(tempfile.gettempdir(), 'yatube-cache',
+                                 'cache.sqlite3'),
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+        },
     }
 }
+
+# Метрики /metrics: каждый процесс пишет снимок в METRICS_DIR, каталог
+# общий для всех воркеров; снимки завершившихся процессов удаляются при
+# сборе метрик.
+# METRICS_ALLOWED_IPS сверяется с REMOTE_ADDR. За обратным прокси на той
+# же машине это адрес прокси, поэтому запросы с X-Forwarded-For
+# отклоняются; прокси, который его не ставит, должен сам закрыть
+# /metrics снаружи
+METRICS_DIR = os.path.join(tempfile.gettempdir(), 'yatube-metrics')
+METRICS_FLUSH_INTERVAL = 1
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']